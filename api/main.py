@@ -3,24 +3,51 @@ FastAPI Backend for Social Media Recommendation System
 Serves ML data to React frontend and provides REST API endpoints.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Optional
+from functools import lru_cache
 import pandas as pd
 import numpy as np
+import orjson
 import os
 import sys
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from recommendation import get_recommendations, create_similarity_matrix
+from recommendation import (
+    rank_recommendations, batch_rank_recommendations, user_columns, build_user_index,
+    build_recommendation_records, load_similarity_matrix, interest_sets,
+    build_interest_index
+)
+
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Upper bound on user IDs per batch request; each ID gathers a full
+# similarity row, so an unbounded list could upcast the whole matrix
+MAX_BATCH_USERS = 100
+
+# Upper bound on recommendations per user; also keeps the payload cache
+# keyed on a small, fixed range of n
+MAX_RECOMMENDATIONS = 100
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson (handles NumPy scalars natively)."""
+    
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
 
 app = FastAPI(
     title="Social Media Recommender API",
     description="ML-powered recommendation engine API",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     root_path="/api" if os.environ.get("VERCEL") else ""
 )
 
@@ -37,10 +64,62 @@ app.add_middleware(
 DATA = {
     "df": None,
     "similarity_matrix": None,
+    "similarity_int8": None,
+    "top_indices": None,
+    "top_scores": None,
     "segment_stats": None,
-    "city_distribution": None
+    "city_distribution": None,
+    "columns": None,
+    "user_index": None,
+    "interest_index": None,
+    "by_segment": None,
+    "n_interests": None,
+    "avg_engagement": None,
+    "avg_followers": None,
+    "n_segments": None,
+    "top_city": None,
+    "resp_segments": None,
+    "resp_cities": None,
+    "resp_hourly": None,
+    "resp_weekly": None,
+    "resp_summary": None
 }
 
+# Segment badge colors
+SEGMENT_COLORS = {
+    "Micro-Influencers": "#f87171",
+    "Engaged Creators": "#8b5cf6",
+    "Rising Stars": "#06b6d4",
+    "Active Community": "#10b981",
+    "Casual Browsers": "#f59e0b"
+}
+
+# City coordinates for map
+CITY_COORDS = {
+    "new york": {"lat": 40.7128, "lng": -74.0060},
+    "los angeles": {"lat": 34.0522, "lng": -118.2437},
+    "london": {"lat": 51.5074, "lng": -0.1278},
+    "mumbai": {"lat": 19.0760, "lng": 72.8777},
+    "tokyo": {"lat": 35.6762, "lng": 139.6503},
+    "paris": {"lat": 48.8566, "lng": 2.3522},
+    "berlin": {"lat": 52.5200, "lng": 13.4050},
+    "sydney": {"lat": -33.8688, "lng": 151.2093},
+    "toronto": {"lat": 43.6532, "lng": -79.3832},
+    "singapore": {"lat": 1.3521, "lng": 103.8198},
+    "dubai": {"lat": 25.2048, "lng": 55.2708},
+    "hong kong": {"lat": 22.3193, "lng": 114.1694},
+    "seoul": {"lat": 37.5665, "lng": 126.9780},
+    "barcelona": {"lat": 41.3851, "lng": 2.1734},
+    "amsterdam": {"lat": 52.3676, "lng": 4.9041}
+}
+
+# Simulated hourly engagement pattern
+HOURLY_ENGAGEMENT = [
+    20, 15, 10, 8, 6, 8, 15, 35,  # 0-7 AM
+    55, 70, 75, 80, 85, 82, 78, 72,  # 8-3 PM
+    68, 75, 88, 95, 100, 85, 65, 40  # 4-11 PM
+]
+
 
 def load_data():
     """Load processed data on startup. Auto-generates if missing."""
@@ -49,40 +128,223 @@ def load_data():
     
     # Load user data
     df_path = os.path.join(data_dir, 'users_segmented.csv')
+    parquet_path = os.path.join(data_dir, 'users_segmented.parquet')
     sim_path = os.path.join(data_dir, 'similarity_matrix.npy')
+    sim_int8_path = os.path.join(data_dir, 'similarity_matrix_int8.npy')
+    neighbors_path = os.path.join(data_dir, 'top_neighbors.npz')
     
     # Auto-generate data if missing
-    if not os.path.exists(df_path) or not os.path.exists(sim_path):
+    has_users = os.path.exists(df_path) or os.path.exists(parquet_path)
+    if not has_users or not os.path.exists(sim_path):
         print("⚠ Data files not found. Running pipeline to generate...")
         sys.path.insert(0, base_dir)
         from run_pipeline import run_pipeline
         run_pipeline()
         print("✓ Pipeline completed successfully")
     
-    # Load user data
-    DATA["df"] = pd.read_csv(df_path)
+    # Load user data (low-cardinality text columns as categoricals to keep
+    # one copy of each string instead of a Python object per row).
+    # Prefer the Parquet copy unless the CSV was written after it; fall back
+    # to CSV when it or pyarrow is missing.
+    category_columns = ['gender', 'city', 'segment_name']
+    parquet_fresh = os.path.exists(parquet_path) and (
+        not os.path.exists(df_path) or os.path.getmtime(parquet_path) >= os.path.getmtime(df_path)
+    )
+    df = None
+    if parquet_fresh:
+        try:
+            df = pd.read_parquet(parquet_path)
+        except ImportError:
+            pass
+    if df is None:
+        # read_csv skips dtype entries for absent columns
+        df = pd.read_csv(df_path, dtype={col: 'category' for col in category_columns})
+    DATA["df"] = df.astype({col: 'category' for col in category_columns if col in df.columns})
+    
+    # Per-column arrays for building user and recommendation responses
+    DATA["columns"] = user_columns(DATA["df"])
+    DATA["columns"]["interest_set"] = interest_sets(DATA["columns"]["interests"])
+    
+    # Inverted interest index for hybrid (feature + interest) ranking
+    DATA["interest_index"] = build_interest_index(DATA["df"]['interests'])
     
-    # Load similarity matrix
+    # Index users by ID and pre-split segments so lookups don't scan the frame
+    DATA["user_index"] = build_user_index(DATA["df"])
+    has_segments = 'segment_name' in DATA["df"].columns
+    DATA["by_segment"] = dict(
+        DATA["df"].groupby('segment_name', sort=False, observed=True).indices
+    ) if has_segments else {}
+    
+    # Memory-map similarity matrix (rows are paged in per request)
     if os.path.exists(sim_path):
-        DATA["similarity_matrix"] = np.load(sim_path)
+        DATA["similarity_matrix"] = load_similarity_matrix(sim_path)
+    
+    # int8 copy used to shortlist candidates (absent for older data)
+    if os.path.exists(sim_int8_path):
+        DATA["similarity_int8"] = load_similarity_matrix(sim_int8_path)
+    
+    # Precomputed top-k neighbor lists (absent for older data)
+    if os.path.exists(neighbors_path):
+        with np.load(neighbors_path) as neighbors:
+            DATA["top_indices"] = neighbors['indices']
+            DATA["top_scores"] = neighbors['scores']
     
     # Calculate segment stats
     df = DATA["df"]
-    segment_stats = df.groupby('segment_name').agg({
+    segment_stats = df.groupby('segment_name', observed=True).agg({
         'user_id': 'count',
         'follower_count': 'mean',
         'engagement_rate': 'mean',
         'influence_score': 'mean'
-    }).round(2).to_dict('index')
+    }).round(2).to_dict('index') if has_segments else {}
     DATA["segment_stats"] = segment_stats
     
     # Calculate city distribution
     city_counts = df['city'].value_counts().to_dict()
     DATA["city_distribution"] = city_counts
     
+    # Cache dataset-wide aggregates used by several payloads
+    DATA["avg_engagement"] = float(df['engagement_rate'].mean())
+    DATA["avg_followers"] = float(df['follower_count'].mean())
+    DATA["n_segments"] = int(df['segment_name'].nunique()) if has_segments else 0
+    DATA["top_city"] = df['city'].mode().iloc[0] if len(df) > 0 else "Unknown"
+    
+    # Count distinct interest tokens
+    DATA["n_interests"] = int(
+        df['interests'].str.split(',').explode().str.strip()
+        .replace('', np.nan).dropna().nunique()
+    )
+    
+    # Serialize request-independent responses once
+    DATA["resp_segments"] = orjson.dumps(build_segments(segment_stats))
+    DATA["resp_cities"] = orjson.dumps(build_cities(city_counts))
+    DATA["resp_hourly"] = orjson.dumps(build_hourly())
+    DATA["resp_weekly"] = orjson.dumps(build_weekly())
+    DATA["resp_summary"] = orjson.dumps(build_summary(len(df)))
+    
+    # Drop per-user responses cached from previously loaded data
+    user_payload.cache_clear()
+    recommendations_payload.cache_clear()
+    
     print(f"✓ Loaded {len(df)} users")
 
 
+def build_segments(stats: dict) -> list:
+    """Build the /segments payload from per-segment aggregates."""
+    result = []
+    for name, data in stats.items():
+        result.append({
+            "name": name,
+            "count": int(data['user_id']),
+            "avg_followers": float(data['follower_count']),
+            "avg_engagement": float(data['engagement_rate']),
+            "avg_influence": float(data['influence_score']),
+            "color": SEGMENT_COLORS.get(name, "#6b7280")
+        })
+    return result
+
+
+def build_cities(cities: dict) -> list:
+    """Build the /cities payload with map coordinates."""
+    result = []
+    for city, count in cities.items():
+        coords = CITY_COORDS.get(city.lower(), {"lat": 0, "lng": 0})
+        result.append({
+            "city": city.title(),
+            "count": int(count),
+            "lat": coords["lat"],
+            "lng": coords["lng"]
+        })
+    return result
+
+
+def build_hourly() -> list:
+    """Build the /engagement/hourly payload."""
+    return [{"hour": h, "engagement": e} for h, e in enumerate(HOURLY_ENGAGEMENT)]
+
+
+def build_weekly() -> list:
+    """Build the /trends/weekly payload from the cached dataset averages."""
+    days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+    base_engagement = DATA["avg_engagement"]
+    base_followers = DATA["avg_followers"]
+    
+    # Weekly pattern: higher on weekends
+    multipliers = [0.85, 0.9, 0.95, 1.0, 1.1, 1.25, 1.2]
+    
+    return [
+        {
+            "day": day,
+            "engagement": round(base_engagement * mult, 2),
+            "followers": int(base_followers * (0.9 + i * 0.02))
+        }
+        for i, (day, mult) in enumerate(zip(days, multipliers))
+    ]
+
+
+def build_summary(total_users: int) -> dict:
+    """Build the /stats/summary payload from the cached aggregates."""
+    return {
+        "total_users": total_users,
+        "total_segments": DATA["n_segments"],
+        "avg_followers": round(DATA["avg_followers"], 0),
+        "avg_engagement": round(DATA["avg_engagement"], 2),
+        "total_interests": DATA["n_interests"],
+        "top_city": DATA["top_city"]
+    }
+
+
+def cached_response(key: str) -> Response:
+    """Return a pre-serialized JSON body from DATA."""
+    body = DATA[key]
+    if body is None:
+        raise HTTPException(status_code=500, detail="Data not loaded")
+    return Response(content=body, media_type="application/json")
+
+
+def precomputed_neighbors(user_idx, n: int):
+    """Slice the precomputed top-k lists, or return None if they can't serve n."""
+    top_indices = DATA["top_indices"]
+    if top_indices is None or not 0 <= n <= top_indices.shape[1]:
+        return None
+    return top_indices[user_idx, :n], DATA["top_scores"][user_idx, :n]
+
+
+def user_records(positions) -> list:
+    """Build plain-dict user records for the given row positions from the column arrays."""
+    names = list(DATA["df"].columns)
+    values = [DATA["columns"][name][positions].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+@lru_cache(maxsize=4096)
+def user_payload(user_id: str) -> bytes:
+    """Serialize a single user record (cached until data is reloaded)."""
+    return orjson.dumps(user_records([DATA["user_index"][user_id]])[0], option=ORJSON_OPTIONS)
+
+
+@lru_cache(maxsize=4096)
+def recommendations_payload(user_id: str, n: int, alpha: float = 1.0) -> bytes:
+    """Rank and serialize recommendations for a user (cached until data is reloaded)."""
+    user_idx = DATA["user_index"][user_id]
+    if alpha < 1:
+        # Blend in interest similarity; the precomputed lists are feature-only
+        ranked = rank_recommendations(
+            user_idx, DATA["similarity_matrix"], interest_index=DATA["interest_index"],
+            n_recommendations=n, alpha=alpha
+        )
+    else:
+        ranked = precomputed_neighbors(user_idx, n)
+    if ranked is None:
+        ranked = rank_recommendations(
+            user_idx, DATA["similarity_matrix"], n_recommendations=n,
+            quantized_similarity=DATA["similarity_int8"]
+        )
+    similar_indices, scores = ranked
+    recs = build_recommendation_records(user_idx, similar_indices, scores, DATA["columns"])
+    return orjson.dumps(recs, option=ORJSON_OPTIONS)
+
+
 @app.on_event("startup")
 async def startup_event():
     load_data()
@@ -130,11 +392,11 @@ async def root():
     return {
         "message": "Social Media Recommender API",
         "total_users": len(DATA["df"]) if DATA["df"] is not None else 0,
-        "endpoints": ["/users", "/users/{user_id}", "/recommendations/{user_id}", "/segments", "/cities"]
+        "endpoints": ["/users", "/users/{user_id}", "/recommendations", "/recommendations/{user_id}", "/segments", "/cities"]
     }
 
 
-@app.get("/users", response_model=List[dict])
+@app.get("/users")
 async def get_users(limit: int = 100, offset: int = 0, segment: Optional[str] = None):
     """Get list of users with optional filtering."""
     df = DATA["df"]
@@ -142,164 +404,112 @@ async def get_users(limit: int = 100, offset: int = 0, segment: Optional[str] =
         raise HTTPException(status_code=500, detail="Data not loaded")
     
     if segment:
-        df = df[df['segment_name'] == segment]
+        positions = DATA["by_segment"].get(segment, np.empty(0, dtype=np.intp))
+    else:
+        positions = np.arange(len(df))
     
-    users = df.iloc[offset:offset+limit].to_dict('records')
-    return users
+    # Only the requested page is turned into dicts; they hold plain Python
+    # values, so skip FastAPI's jsonable_encoder pass
+    return ORJSONResponse(user_records(positions[offset:offset+limit]))
 
 
 @app.get("/users/{user_id}")
 async def get_user(user_id: str):
     """Get single user by ID."""
-    df = DATA["df"]
-    if df is None:
+    if DATA["df"] is None:
         raise HTTPException(status_code=500, detail="Data not loaded")
     
-    user = df[df['user_id'] == user_id]
-    if len(user) == 0:
+    if user_id not in DATA["user_index"]:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return user.iloc[0].to_dict()
+    return Response(content=user_payload(user_id), media_type="application/json")
 
 
 @app.get("/recommendations/{user_id}")
-async def get_user_recommendations(user_id: str, n: int = 10):
-    """Get recommendations for a specific user."""
+def get_user_recommendations(user_id: str, n: int = Query(10, ge=1, le=MAX_RECOMMENDATIONS),
+                             alpha: float = Query(1.0, ge=0, le=1)):
+    """Get recommendations for a specific user (alpha < 1 blends in shared interests)."""
+    # Declared sync so FastAPI runs it in its threadpool instead of blocking
+    # the event loop; the memory-mapped matrix is read-only, so no locking.
     df = DATA["df"]
     sim_matrix = DATA["similarity_matrix"]
     
     if df is None or sim_matrix is None:
         raise HTTPException(status_code=500, detail="Data not loaded")
     
+    if user_id not in DATA["user_index"]:
+        raise HTTPException(status_code=400, detail=f"User {user_id} not found")
+    
     try:
-        recs = get_recommendations(user_id, df, sim_matrix, n_recommendations=n)
-        return recs.to_dict('records')
+        return Response(content=recommendations_payload(user_id, n, alpha), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/segments")
-async def get_segments():
-    """Get segment statistics."""
-    stats = DATA["segment_stats"]
-    if stats is None:
+@app.get("/recommendations")
+def get_batch_recommendations(user_ids: str, n: int = Query(10, ge=1, le=MAX_RECOMMENDATIONS)):
+    """Get recommendations for several users (comma-separated IDs) in one call."""
+    # Ranks every requested row in one pass over the similarity matrix,
+    # so clients showing many users should prefer this to N single calls.
+    df = DATA["df"]
+    sim_matrix = DATA["similarity_matrix"]
+    
+    if df is None or sim_matrix is None:
         raise HTTPException(status_code=500, detail="Data not loaded")
     
-    # Add colors
-    colors = {
-        "Micro-Influencers": "#f87171",
-        "Engaged Creators": "#8b5cf6",
-        "Rising Stars": "#06b6d4",
-        "Active Community": "#10b981",
-        "Casual Browsers": "#f59e0b"
-    }
+    ids = [uid.strip() for uid in user_ids.split(',') if uid.strip()]
+    if len(ids) > MAX_BATCH_USERS:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_BATCH_USERS} user IDs per request")
     
-    result = []
-    for name, data in stats.items():
-        result.append({
-            "name": name,
-            "count": int(data['user_id']),
-            "avg_followers": float(data['follower_count']),
-            "avg_engagement": float(data['engagement_rate']),
-            "avg_influence": float(data['influence_score']),
-            "color": colors.get(name, "#6b7280")
-        })
+    user_index = DATA["user_index"]
+    missing = [uid for uid in ids if uid not in user_index]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"User {missing[0]} not found")
     
-    return result
+    try:
+        user_indices = np.array([user_index[uid] for uid in ids], dtype=np.intp)
+        ranked = precomputed_neighbors(user_indices, n)
+        if ranked is None:
+            ranked = batch_rank_recommendations(user_indices, sim_matrix, n_recommendations=n)
+        all_indices, all_scores = ranked
+        recs = {
+            uid: build_recommendation_records(user_idx, indices, scores, DATA["columns"])
+            for uid, user_idx, indices, scores in zip(ids, user_indices, all_indices, all_scores)
+        }
+        return ORJSONResponse(recs)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/segments")
+async def get_segments():
+    """Get segment statistics."""
+    return cached_response("resp_segments")
 
 
 @app.get("/cities")
 async def get_city_distribution():
     """Get city distribution for map visualization."""
-    cities = DATA["city_distribution"]
-    if cities is None:
-        raise HTTPException(status_code=500, detail="Data not loaded")
-    
-    # Add coordinates for map
-    city_coords = {
-        "new york": {"lat": 40.7128, "lng": -74.0060},
-        "los angeles": {"lat": 34.0522, "lng": -118.2437},
-        "london": {"lat": 51.5074, "lng": -0.1278},
-        "mumbai": {"lat": 19.0760, "lng": 72.8777},
-        "tokyo": {"lat": 35.6762, "lng": 139.6503},
-        "paris": {"lat": 48.8566, "lng": 2.3522},
-        "berlin": {"lat": 52.5200, "lng": 13.4050},
-        "sydney": {"lat": -33.8688, "lng": 151.2093},
-        "toronto": {"lat": 43.6532, "lng": -79.3832},
-        "singapore": {"lat": 1.3521, "lng": 103.8198},
-        "dubai": {"lat": 25.2048, "lng": 55.2708},
-        "hong kong": {"lat": 22.3193, "lng": 114.1694},
-        "seoul": {"lat": 37.5665, "lng": 126.9780},
-        "barcelona": {"lat": 41.3851, "lng": 2.1734},
-        "amsterdam": {"lat": 52.3676, "lng": 4.9041}
-    }
-    
-    result = []
-    for city, count in cities.items():
-        coords = city_coords.get(city.lower(), {"lat": 0, "lng": 0})
-        result.append({
-            "city": city.title(),
-            "count": count,
-            "lat": coords["lat"],
-            "lng": coords["lng"]
-        })
-    
-    return result
+    return cached_response("resp_cities")
 
 
 @app.get("/engagement/hourly")
 async def get_hourly_engagement():
     """Get simulated hourly engagement data."""
-    # Generate realistic hourly engagement pattern
-    hours = list(range(24))
-    engagement = [
-        20, 15, 10, 8, 6, 8, 15, 35,  # 0-7 AM
-        55, 70, 75, 80, 85, 82, 78, 72,  # 8-3 PM
-        68, 75, 88, 95, 100, 85, 65, 40  # 4-11 PM
-    ]
-    
-    return [{"hour": h, "engagement": e} for h, e in zip(hours, engagement)]
+    return cached_response("resp_hourly")
 
 
 @app.get("/trends/weekly")
 async def get_weekly_trends():
     """Get weekly trend data."""
-    df = DATA["df"]
-    if df is None:
-        raise HTTPException(status_code=500, detail="Data not loaded")
-    
-    # Generate weekly trend based on actual data
-    days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    base_engagement = df['engagement_rate'].mean()
-    
-    # Weekly pattern: higher on weekends
-    multipliers = [0.85, 0.9, 0.95, 1.0, 1.1, 1.25, 1.2]
-    
-    return [
-        {
-            "day": day,
-            "engagement": round(base_engagement * mult, 2),
-            "followers": int(df['follower_count'].mean() * (0.9 + i * 0.02))
-        }
-        for i, (day, mult) in enumerate(zip(days, multipliers))
-    ]
+    return cached_response("resp_weekly")
 
 
 @app.get("/stats/summary")
 async def get_summary_stats():
     """Get overall summary statistics."""
-    df = DATA["df"]
-    if df is None:
-        raise HTTPException(status_code=500, detail="Data not loaded")
-    
-    return {
-        "total_users": len(df),
-        "total_segments": df['segment_name'].nunique() if 'segment_name' in df.columns else 0,
-        "avg_followers": round(df['follower_count'].mean(), 0),
-        "avg_engagement": round(df['engagement_rate'].mean(), 2),
-        "total_interests": len(set(','.join(df['interests']).split(','))),
-        "top_city": df['city'].mode().iloc[0] if len(df) > 0 else "Unknown"
-    }
+    return cached_response("resp_summary")
 
 
 if __name__ == "__main__":
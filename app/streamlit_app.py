@@ -15,7 +15,11 @@ import sys
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from recommendation import get_recommendations, get_segment_based_recommendations, get_diverse_recommendations
+from recommendation import (
+    get_recommendations, get_segment_based_recommendations, get_diverse_recommendations,
+    build_user_index, build_interest_index, load_similarity_matrix
+)
+from utils import percentile_ranker
 
 
 # Page configuration
@@ -27,7 +31,7 @@ st.set_page_config(
 )
 
 # Enhanced Custom CSS with Dark Theme
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     /* Dark theme base */
     .stApp {
@@ -110,7 +114,8 @@ st.markdown("""
     #MainMenu {visibility: hidden;}
     footer {visibility: hidden;}
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 
 # City coordinates for map
@@ -132,10 +137,27 @@ CITY_COORDS = {
     "amsterdam": {"lat": 52.3676, "lon": 4.9041}
 }
 
+# Same coordinates as a frame for vectorized joins
+CITY_COORDS_DF = pd.DataFrame(
+    [(city, c['lat'], c['lon']) for city, c in CITY_COORDS.items()],
+    columns=['city_key', 'lat', 'lon']
+)
+
+# Segment badge colors
+SEGMENT_COLORS = {
+    'Micro-Influencers': '#f87171',
+    'Engaged Creators': '#8b5cf6',
+    'Rising Stars': '#06b6d4',
+    'Active Community': '#10b981',
+    'Casual Browsers': '#f59e0b',
+    'New Users': '#ec4899',
+    'Passive Viewers': '#6b7280'
+}
+
 
 @st.cache_data
 def load_data():
-    """Load processed data and similarity matrix. Auto-generates if missing."""
+    """Load processed user data. Auto-generates if missing."""
     base_dir = os.path.dirname(os.path.dirname(__file__))
     data_dir = os.path.join(base_dir, 'data', 'processed')
     
@@ -148,15 +170,62 @@ def load_data():
             run_pipeline()
             st.rerun()
     
-    df = pd.read_csv(df_path)
-    
-    sim_path = os.path.join(data_dir, 'similarity_matrix.npy')
+    return pd.read_csv(df_path)
+
+
+@st.cache_resource
+def load_user_similarity():
+    """Memory-map the float16 similarity matrix once per process (None if missing)."""
+    # cache_resource keeps the memmap itself; cache_data would pickle a full copy
+    base_dir = os.path.dirname(os.path.dirname(__file__))
+    sim_path = os.path.join(base_dir, 'data', 'processed', 'similarity_matrix.npy')
     if os.path.exists(sim_path):
-        user_similarity = np.load(sim_path)
-    else:
-        user_similarity = None
-    
-    return df, user_similarity
+        return load_similarity_matrix(sim_path)
+    return None
+
+
+@st.cache_data
+def count_interest_categories(df):
+    """Count distinct interest tokens across all users."""
+    return int(
+        df['interests'].str.split(',').explode().str.strip()
+        .replace('', np.nan).dropna().nunique()
+    )
+
+
+@st.cache_data
+def top_interests(df, n=15):
+    """Count the most common interest tokens across all users."""
+    tokens = df['interests'].str.split(',').explode().str.strip()
+    return tokens[tokens.notna() & (tokens != '')].value_counts().head(n)
+
+
+@st.cache_resource
+def build_user_lookup(df):
+    """Index rows by username and user ID and split the frame into per-column NumPy arrays."""
+    row_by_username = {name: i for i, name in enumerate(df['username'].to_numpy())}
+    user_columns = {col: df[col].to_numpy() for col in df.columns}
+    return row_by_username, build_user_index(df), user_columns
+
+
+@st.cache_resource
+def load_interest_index(df):
+    """Build the inverted interest index used by hybrid recommendations."""
+    return build_interest_index(df['interests'])
+
+
+@st.cache_resource
+def build_percentile_rankers(df):
+    """Sort each profile metric once so every selected user is ranked with a binary search."""
+    metrics = ['follower_count', 'following_count', 'posts_count', 'engagement_rate']
+    return {col: percentile_ranker(df[col]) for col in metrics if col in df.columns}
+
+
+def percentile_help(rankers, col, value):
+    """Tooltip text placing a user's metric among all users."""
+    if col not in rankers:
+        return None
+    return f"Higher than {rankers[col](value):.0f}% of users"
 
 
 def format_number(num):
@@ -171,31 +240,18 @@ def format_number(num):
 
 def get_segment_color(segment_name):
     """Get color for segment badge."""
-    colors = {
-        'Micro-Influencers': '#f87171',
-        'Engaged Creators': '#8b5cf6',
-        'Rising Stars': '#06b6d4',
-        'Active Community': '#10b981',
-        'Casual Browsers': '#f59e0b',
-        'New Users': '#ec4899',
-        'Passive Viewers': '#6b7280'
-    }
-    return colors.get(segment_name, '#8b5cf6')
+    return SEGMENT_COLORS.get(segment_name, '#8b5cf6')
 
 
+@st.cache_data
 def create_city_map(df):
     """Create interactive map showing user distribution by city."""
     city_counts = df['city'].value_counts().reset_index()
     city_counts.columns = ['city', 'count']
     
-    # Add coordinates
-    city_counts['lat'] = city_counts['city'].apply(
-        lambda x: CITY_COORDS.get(x.lower(), {}).get('lat', 0)
-    )
-    city_counts['lon'] = city_counts['city'].apply(
-        lambda x: CITY_COORDS.get(x.lower(), {}).get('lon', 0)
-    )
-    city_counts = city_counts[city_counts['lat'] != 0]
+    # Add coordinates (cities without a known location are dropped)
+    city_counts['city_key'] = city_counts['city'].str.lower()
+    city_counts = city_counts.merge(CITY_COORDS_DF, on='city_key', how='inner')
     
     fig = go.Figure()
     
@@ -210,8 +266,9 @@ def create_city_map(df):
             opacity=0.8,
             line=dict(width=1, color='white')
         ),
-        text=city_counts.apply(
-            lambda r: f"<b>{r['city'].title()}</b><br>Users: {r['count']:,}", axis=1
+        text=(
+            '<b>' + city_counts['city'].str.title() + '</b><br>Users: ' +
+            city_counts['count'].map('{:,}'.format)
         ),
         hoverinfo='text'
     ))
@@ -239,6 +296,7 @@ def create_city_map(df):
     return fig
 
 
+@st.cache_data
 def create_engagement_radar(df):
     """Create radar chart showing engagement by hour."""
     # Simulated hourly engagement pattern
@@ -285,6 +343,7 @@ def create_engagement_radar(df):
     return fig
 
 
+@st.cache_data
 def create_weekly_trend(df):
     """Create weekly engagement trend chart."""
     days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
@@ -324,6 +383,7 @@ def create_weekly_trend(df):
     return fig
 
 
+@st.cache_data
 def create_segment_donut(df):
     """Create donut chart for segment distribution."""
     if 'segment_name' not in df.columns:
@@ -360,7 +420,8 @@ def create_segment_donut(df):
 
 def main():
     # Load data
-    df, user_similarity = load_data()
+    df = load_data()
+    user_similarity = load_user_similarity()
     
     # Premium Header
     st.markdown('<h1 class="main-header">🎯 SocialAI Recommender</h1>', unsafe_allow_html=True)
@@ -396,7 +457,7 @@ def main():
         """, unsafe_allow_html=True)
     
     with stats_col4:
-        total_interests = len(set(','.join(df['interests']).split(',')))
+        total_interests = count_interest_categories(df)
         st.markdown(f"""
             <div class="metric-card">
                 <div class="stat-value">{total_interests}</div>
@@ -412,13 +473,15 @@ def main():
     search_term = st.sidebar.text_input("Search username", "")
     
     if search_term:
-        filtered_users = df[df['username'].str.contains(search_term, case=False)]
+        filtered_users = df[df['username'].str.contains(search_term, case=False, regex=False)]
         username_options = filtered_users['username'].tolist() if len(filtered_users) > 0 else df['username'].tolist()
     else:
         username_options = df['username'].tolist()
     
     selected_user = st.sidebar.selectbox("Select User", username_options, index=0)
-    user_data = df[df['username'] == selected_user].iloc[0]
+    row_by_username, row_by_user_id, user_columns = build_user_lookup(df)
+    row = row_by_username[selected_user]
+    user_data = {col: values[row] for col, values in user_columns.items()}
     user_id = user_data['user_id']
     
     st.sidebar.markdown("---")
@@ -442,12 +505,17 @@ def main():
         
         st.markdown("<br>", unsafe_allow_html=True)
         
+        rankers = build_percentile_rankers(df)
         m1, m2, m3, m4 = st.columns(4)
-        m1.metric("Followers", format_number(user_data['follower_count']))
-        m2.metric("Following", format_number(user_data['following_count']))
-        m3.metric("Posts", format_number(user_data['posts_count']))
+        m1.metric("Followers", format_number(user_data['follower_count']),
+                  help=percentile_help(rankers, 'follower_count', user_data['follower_count']))
+        m2.metric("Following", format_number(user_data['following_count']),
+                  help=percentile_help(rankers, 'following_count', user_data['following_count']))
+        m3.metric("Posts", format_number(user_data['posts_count']),
+                  help=percentile_help(rankers, 'posts_count', user_data['posts_count']))
         if 'engagement_rate' in user_data:
-            m4.metric("Engagement", f"{user_data['engagement_rate']:.1f}")
+            m4.metric("Engagement", f"{user_data['engagement_rate']:.1f}",
+                      help=percentile_help(rankers, 'engagement_rate', user_data['engagement_rate']))
         
         st.markdown("**Interests:**")
         interests = user_data['interests'].split(',')
@@ -474,11 +542,16 @@ def main():
         if user_similarity is not None:
             try:
                 if rec_type == "Hybrid (Best)":
-                    recommendations = get_recommendations(user_id, df, user_similarity, n_recommendations=n_recommendations)
+                    recommendations = get_recommendations(user_id, df, user_similarity,
+                                                          interest_index=load_interest_index(df),
+                                                          n_recommendations=n_recommendations,
+                                                          user_index=row_by_user_id)
                 elif rec_type == "Same Segment":
-                    recommendations = get_segment_based_recommendations(user_id, df, n_recommendations=n_recommendations)
+                    recommendations = get_segment_based_recommendations(user_id, df, n_recommendations=n_recommendations,
+                                                                        user_index=row_by_user_id)
                 else:
-                    recommendations = get_diverse_recommendations(user_id, df, user_similarity, n_recommendations=n_recommendations)
+                    recommendations = get_diverse_recommendations(user_id, df, user_similarity, n_recommendations=n_recommendations,
+                                                                  user_index=row_by_user_id)
                 
                 for idx, row in recommendations.head(n_recommendations).iterrows():
                     with st.expander(f"**{idx+1}. {row['username']}** ({row.get('segment', 'Unknown')})", expanded=idx<3):
@@ -543,12 +616,7 @@ def main():
         st.plotly_chart(fig, use_container_width=True)
     
     with tab3:
-        all_interests = []
-        for interests_str in df['interests']:
-            if interests_str:
-                all_interests.extend([i.strip() for i in interests_str.split(',') if i.strip()])
-        
-        interest_counts = pd.Series(all_interests).value_counts().head(15)
+        interest_counts = top_interests(df)
         
         fig = px.treemap(
             names=interest_counts.index,
@@ -1,5 +1,6 @@
 import pandas as pd
-import json
+import ast
+import orjson
 import os
 
 # Load the segmented data
@@ -23,50 +24,87 @@ segment_colors = {
     'Newbies': '#6b7280'
 }
 
-# Process the data
-users = []
-for idx, row in sample_df.iterrows():
-    # Parse interests (might be a string representation of list)
-    interests = row.get('interests', '[]')
-    if isinstance(interests, str):
-        try:
-            interests = eval(interests) if interests.startswith('[') else interests.split(',')
-        except:
-            interests = ['general']
-    
-    segment_name = str(row.get('segment_name', 'Casual Users'))
+
+def column(name, default):
+    """Return a column of sample_df, or a constant default if it is missing."""
+    if name in sample_df.columns:
+        return sample_df[name]
+    return pd.Series(default, index=sample_df.index)
+
+
+def parse_interest_list(text):
+    """Parse a string representation of a list of interests."""
+    try:
+        interests = ast.literal_eval(text)
+    except Exception:
+        # literal_eval also raises TypeError, MemoryError and RecursionError
+        # on malformed input; any failure falls back like the old eval path
+        interests = ['general']
+    return interests if isinstance(interests, list) else [interests]
+
+
+def parse_interests(raw):
+    """Parse interests (comma-separated, or a string representation of list)."""
+    # Split comma-separated strings in bulk; only list literals need parsing
+    is_list = raw.str.startswith('[', na=False)
+    interests = raw.str.split(',')
+    interests = interests.where(~is_list, raw[is_list].map(parse_interest_list))
     
-    user = {
-        'userId': str(row.get('user_id', f'U{idx:04d}')),
-        'username': str(row.get('username', f'user_{idx}')),
-        'age': int(row.get('age', 25)),
-        'gender': str(row.get('gender', 'Unknown')),
-        'city': str(row.get('city', 'Unknown')),
-        'interests': interests if isinstance(interests, list) else [interests],
-        'followers': int(row.get('follower_count', 0)),
-        'following': int(row.get('following_count', 0)),
-        'posts': int(row.get('post_count', 0)) if 'post_count' in row else int(row.get('activity_score', 0) * 10),
-        'likes': int(row.get('follower_count', 0) * 0.1),
-        'comments': int(row.get('follower_count', 0) * 0.02),
-        'shares': int(row.get('follower_count', 0) * 0.005),
-        'engagementRate': str(round(float(row.get('engagement', row.get('activity_score', 5))), 2)),
-        'influenceScore': str(round(float(row.get('influence_score', 0.5)), 3)),
-        'segment': segment_name,
-        'segmentColor': segment_colors.get(segment_name, '#6b7280'),
-        'segmentId': list(segment_colors.keys()).index(segment_name) if segment_name in segment_colors else 4,
-        'isVerified': bool(row.get('is_verified', False))
-    }
-    users.append(user)
+    # Non-string values are wrapped as-is
+    return interests.where(interests.notna(), raw.map(lambda value: [value]))
+
+
+# Process the data column-wise
+segment_names = column('segment_name', 'Casual Users').astype(str)
+follower_count = column('follower_count', 0)
+segment_ids = {name: i for i, name in enumerate(segment_colors)}
+
+if 'post_count' in sample_df.columns:
+    posts = sample_df['post_count'].astype(int)
+else:
+    posts = (column('activity_score', 0) * 10).astype(int)
+
+if 'user_id' in sample_df.columns:
+    user_ids = sample_df['user_id'].astype(str)
+else:
+    user_ids = pd.Series([f'U{idx:04d}' for idx in sample_df.index], index=sample_df.index)
+
+if 'username' in sample_df.columns:
+    usernames = sample_df['username'].astype(str)
+else:
+    usernames = pd.Series([f'user_{idx}' for idx in sample_df.index], index=sample_df.index)
+
+users_df = pd.DataFrame({
+    'userId': user_ids,
+    'username': usernames,
+    'age': column('age', 25).astype(int),
+    'gender': column('gender', 'Unknown').astype(str),
+    'city': column('city', 'Unknown').astype(str),
+    'interests': parse_interests(column('interests', '[]')),
+    'followers': follower_count.astype(int),
+    'following': column('following_count', 0).astype(int),
+    'posts': posts,
+    'likes': (follower_count * 0.1).astype(int),
+    'comments': (follower_count * 0.02).astype(int),
+    'shares': (follower_count * 0.005).astype(int),
+    'engagementRate': column('engagement', column('activity_score', 5)).astype(float).round(2).astype(str),
+    'influenceScore': column('influence_score', 0.5).astype(float).round(3).astype(str),
+    'segment': segment_names,
+    'segmentColor': segment_names.map(segment_colors).fillna('#6b7280'),
+    'segmentId': segment_names.map(segment_ids).fillna(4).astype(int),
+    'isVerified': column('is_verified', False).astype(bool)
+})
+users = users_df.to_dict('records')
 
 # Save to JSON
 output_path = 'app/public/kaggle_users.json'
 os.makedirs('app/public', exist_ok=True)
 
-with open(output_path, 'w') as f:
-    json.dump(users, f)
+with open(output_path, 'wb') as f:
+    f.write(orjson.dumps(users, option=orjson.OPT_SERIALIZE_NUMPY))
 
 print(f"\nExported {len(users)} users to {output_path}")
-print(f"Sample user: {json.dumps(users[0], indent=2)}")
+print(f"Sample user: {orjson.dumps(users[0], option=orjson.OPT_INDENT_2).decode()}")
 
 # Get segment distribution
 segments = {}
@@ -20,7 +20,9 @@ from segmentation import (
     find_optimal_clusters, perform_clustering, profile_segments,
     assign_segment_names, visualize_segments
 )
-from recommendation import create_similarity_matrix
+from recommendation import (
+    create_similarity_matrix, save_similarity_artifacts, get_all_recommendations
+)
 
 
 def run_pipeline():
@@ -46,7 +48,7 @@ def run_pipeline():
     print("="*70)
     
     df = generate_synthetic_data(n_users=n_users)
-    raw_path = os.path.join(base_dir, 'data', 'raw', 'social_media_users.csv')
+    raw_path = os.path.join(base_dir, 'data', 'raw', 'social_media_users.parquet')
     save_raw_data(df, raw_path)
     
     print(f"✓ Generated {len(df)} synthetic users")
@@ -64,7 +66,7 @@ def run_pipeline():
     if not validate_data(df_clean):
         print("⚠ Data validation failed, but continuing...")
     
-    processed_path = os.path.join(base_dir, 'data', 'processed', 'cleaned_users.csv')
+    processed_path = os.path.join(base_dir, 'data', 'processed', 'cleaned_users.parquet')
     save_processed_data(df_clean, processed_path)
     
     print(f"✓ Cleaned dataset: {len(df_clean)} users")
@@ -77,10 +79,10 @@ def run_pipeline():
     print("="*70)
     
     # Extract features
-    interest_features, tfidf_model = extract_interest_features(df_clean)
-    df_clean, gender_encoder, city_encoder = create_demographic_features(df_clean)
+    interest_features, interest_names, interest_vectorizer = extract_interest_features(df_clean)
+    df_clean, gender_codes, city_codes = create_demographic_features(df_clean)
     df_clean = create_engagement_features(df_clean)
-    X_scaled, scaler, feature_names = create_feature_matrix(df_clean, interest_features)
+    X_scaled, scaler, feature_names = create_feature_matrix(df_clean, interest_features, interest_names)
     
     # Save features and models
     processed_dir = os.path.join(base_dir, 'data', 'processed')
@@ -90,12 +92,13 @@ def run_pipeline():
     save_features(X_scaled, scaler, feature_names, processed_dir)
     
     import joblib
-    joblib.dump(tfidf_model, os.path.join(model_dir, 'tfidf_model.pkl'))
-    joblib.dump(gender_encoder, os.path.join(model_dir, 'gender_encoder.pkl'))
-    joblib.dump(city_encoder, os.path.join(model_dir, 'city_encoder.pkl'))
+    joblib.dump(interest_vectorizer, os.path.join(model_dir, 'interest_vectorizer.pkl'))
+    joblib.dump(gender_codes, os.path.join(model_dir, 'gender_codes.pkl'))
+    joblib.dump(city_codes, os.path.join(model_dir, 'city_codes.pkl'))
     
     # Save intermediate dataframe
-    df_clean.to_csv(os.path.join(processed_dir, 'users_with_features.csv'), index=False)
+    df_clean.to_parquet(os.path.join(processed_dir, 'users_with_features.parquet'),
+                        compression='zstd', index=False)
     
     print(f"✓ Created {len(feature_names)} features")
     print(f"✓ Feature matrix shape: {X_scaled.shape}")
@@ -109,8 +112,10 @@ def run_pipeline():
     
     viz_dir = os.path.join(base_dir, 'results', 'visualizations')
     
-    # Find optimal clusters
-    optimal_k = find_optimal_clusters(X_scaled, max_k=8, output_dir=viz_dir)
+    # Find optimal clusters (serially on cloud, where each worker process
+    # would load its own copy of numpy/scipy/sklearn)
+    optimal_k = find_optimal_clusters(X_scaled, max_k=8, output_dir=viz_dir,
+                                      n_jobs=1 if is_cloud else -1)
     
     # Perform clustering
     labels, kmeans_model = perform_clustering(X_scaled, optimal_k)
@@ -126,8 +131,11 @@ def run_pipeline():
     # Save clustering model
     joblib.dump(kmeans_model, os.path.join(model_dir, 'kmeans_model.pkl'))
     
-    # Save segmented data
+    # Save segmented data (Parquet for fast typed loads, CSV for export tools).
+    # Parquet goes last: the API only prefers it when it is newer than the CSV.
     df_clean.to_csv(os.path.join(processed_dir, 'users_segmented.csv'), index=False)
+    df_clean.to_parquet(os.path.join(processed_dir, 'users_segmented.parquet'),
+                        compression='zstd', index=False)
     
     # Save profiles
     results_dir = os.path.join(base_dir, 'results')
@@ -146,12 +154,18 @@ def run_pipeline():
     # Create similarity matrix
     user_similarity = create_similarity_matrix(X_scaled)
     
-    # Save similarity matrix
-    import numpy as np
-    np.save(os.path.join(processed_dir, 'similarity_matrix.npy'), user_similarity)
+    # Save similarity matrix and the files derived from it
+    save_similarity_artifacts(user_similarity, processed_dir, df_clean)
     
     print(f"✓ Created similarity matrix: {user_similarity.shape}")
     
+    # Backfill every user's recommendations in one batched pass
+    all_recs = get_all_recommendations(df_clean, user_similarity, n_recommendations=10)
+    all_recs.to_parquet(os.path.join(processed_dir, 'recommendations.parquet'),
+                        compression='zstd', index=False)
+    
+    print(f"✓ Backfilled {len(all_recs):,} recommendations")
+    
     # Test recommendations
     from recommendation import get_recommendations
     
@@ -178,8 +192,13 @@ def run_pipeline():
     print(f"   • Similarity matrix: {user_similarity.shape}")
     
     print(f"\n📁 Output files:")
+    print(f"   • data/processed/users_segmented.parquet")
     print(f"   • data/processed/users_segmented.csv")
     print(f"   • data/processed/similarity_matrix.npy")
+    print(f"   • data/processed/similarity_matrix_int8.npy")
+    print(f"   • data/processed/top_neighbors.npz")
+    print(f"   • data/processed/interest_neighbors.npz")
+    print(f"   • data/processed/recommendations.parquet")
     print(f"   • data/models/kmeans_model.pkl")
     print(f"   • results/segment_profiles.csv")
     print(f"   • results/visualizations/optimal_clusters.png")
@@ -20,11 +20,15 @@ def generate_synthetic_data(n_users: int = 10000, random_seed: int = 42) -> pd.D
     Returns:
         DataFrame with synthetic user data
     """
-    np.random.seed(random_seed)
+    rng = np.random.default_rng(random_seed)
     
     # Demographics
-    ages = np.random.randint(18, 65, n_users)
-    genders = np.random.choice(['Male', 'Female', 'Non-binary'], n_users, p=[0.48, 0.48, 0.04])
+    ages = rng.integers(18, 65, n_users)
+    gender_options = ['Male', 'Female', 'Non-binary']
+    genders = pd.Categorical(
+        rng.choice(gender_options, n_users, p=[0.48, 0.48, 0.04]),
+        categories=gender_options
+    )
     
     # Interest pool with categories
     interest_pool = [
@@ -34,28 +38,39 @@ def generate_synthetic_data(n_users: int = 10000, random_seed: int = 42) -> pd.D
         'cooking', 'reading', 'movies', 'nature', 'cars', 'pets'
     ]
     
-    # Generate interests (multi-label)
-    interests = []
-    for _ in range(n_users):
-        n_interests = np.random.randint(2, 7)
-        user_interests = ','.join(np.random.choice(interest_pool, n_interests, replace=False))
-        interests.append(user_interests)
+    # Generate interests (multi-label): 2-6 distinct interests per user,
+    # taken from an independent shuffle of the pool for every user at once
+    max_interests = 6
+    n_interests = rng.integers(2, max_interests + 1, n_users)
+    order = rng.permuted(np.tile(np.arange(len(interest_pool)), (n_users, 1)), axis=1)[:, :max_interests]
+    picked = np.asarray(interest_pool)[order]
+    
+    # Join at C speed: append a comma to every used slot, blank the unused
+    # ones, concatenate the columns and drop the trailing comma
+    slots = np.where(np.arange(max_interests) < n_interests[:, None], np.char.add(picked, ','), '')
+    interests = slots[:, 0]
+    for j in range(1, max_interests):
+        interests = np.char.add(interests, slots[:, j])
+    interests = np.char.rstrip(interests, ',')
     
     # Engagement metrics with realistic distributions
     # Using exponential distribution for follower counts (most have few, some have many)
-    follower_counts = np.random.exponential(1500, n_users).astype(int)
-    follower_counts = np.clip(follower_counts, 10, 100000)  # Realistic bounds
+    follower_counts = rng.exponential(1500, n_users).astype(int)
+    np.clip(follower_counts, 10, 100000, out=follower_counts)  # Realistic bounds
     
-    following_counts = np.random.exponential(800, n_users).astype(int)
-    following_counts = np.clip(following_counts, 5, 5000)
+    following_counts = rng.exponential(800, n_users).astype(int)
+    np.clip(following_counts, 5, 5000, out=following_counts)
     
-    posts_counts = np.random.randint(10, 500, n_users)
+    posts_counts = rng.integers(10, 500, n_users)
     
     # Engagement correlated with follower count but with noise
-    base_engagement = follower_counts * np.random.uniform(0.02, 0.12, n_users)
-    likes_received = base_engagement.astype(int)
-    comments_received = (likes_received * np.random.uniform(0.05, 0.15, n_users)).astype(int)
-    shares = (likes_received * np.random.uniform(0.02, 0.08, n_users)).astype(int)
+    # (each product is truncated straight into a preallocated int array)
+    likes_received = np.empty(n_users, dtype=int)
+    comments_received = np.empty(n_users, dtype=int)
+    shares = np.empty(n_users, dtype=int)
+    np.multiply(follower_counts, rng.uniform(0.02, 0.12, n_users), out=likes_received, casting='unsafe')
+    np.multiply(likes_received, rng.uniform(0.05, 0.15, n_users), out=comments_received, casting='unsafe')
+    np.multiply(likes_received, rng.uniform(0.02, 0.08, n_users), out=shares, casting='unsafe')
     
     # Location distribution
     cities = [
@@ -63,13 +78,13 @@ def generate_synthetic_data(n_users: int = 10000, random_seed: int = 42) -> pd.D
         'Paris', 'Berlin', 'Sydney', 'Toronto', 'Singapore',
         'Dubai', 'Hong Kong', 'Seoul', 'Barcelona', 'Amsterdam'
     ]
-    cities_list = np.random.choice(cities, n_users)
+    cities_list = pd.Categorical(rng.choice(cities, n_users), categories=cities)
     
     # Account age (days since creation)
-    account_ages = np.random.randint(30, 2000, n_users)
+    account_ages = rng.integers(30, 2000, n_users)
     
     # Verified status (rare)
-    verified = np.random.choice([True, False], n_users, p=[0.02, 0.98])
+    verified = rng.choice([True, False], n_users, p=[0.02, 0.98])
     
     # Create DataFrame
     df = pd.DataFrame({
@@ -93,9 +108,12 @@ def generate_synthetic_data(n_users: int = 10000, random_seed: int = 42) -> pd.D
 
 
 def save_raw_data(df: pd.DataFrame, output_path: str) -> None:
-    """Save generated data to CSV file."""
+    """Save generated data to a Parquet (.parquet) or CSV file."""
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    df.to_csv(output_path, index=False)
+    if output_path.endswith('.parquet'):
+        df.to_parquet(output_path, compression='zstd', index=False)
+    else:
+        df.to_csv(output_path, index=False)
     print(f"Saved {len(df)} users to {output_path}")
 
 
@@ -112,5 +130,5 @@ if __name__ == "__main__":
     print(df.describe())
     
     # Save to raw data folder
-    output_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'social_media_users.csv')
+    output_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'social_media_users.parquet')
     save_raw_data(df, output_path)
@@ -9,8 +9,11 @@ import os
 
 
 def load_raw_data(filepath: str) -> pd.DataFrame:
-    """Load raw data from CSV file."""
-    df = pd.read_csv(filepath)
+    """Load raw data from a Parquet (.parquet) or CSV file."""
+    if filepath.endswith('.parquet'):
+        df = pd.read_parquet(filepath)
+    else:
+        df = pd.read_csv(filepath)
     print(f"Loaded {len(df)} records from {filepath}")
     return df
 
@@ -42,30 +45,39 @@ def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     # Step 2: Handle missing values
     df['interests'] = df['interests'].fillna('')
     df['age'] = df['age'].fillna(df['age'].median())
-    df['city'] = df['city'].fillna('Unknown')
-    df['gender'] = df['gender'].fillna('Unknown')
+    
+    # Fill text as object: categorical input can't take a new 'Unknown' value
+    df['city'] = df['city'].astype(object).fillna('Unknown')
+    df['gender'] = df['gender'].astype(object).fillna('Unknown')
     
     # Fill numeric columns with median
     numeric_cols = ['follower_count', 'following_count', 'posts_count', 
                     'likes_received', 'comments_received', 'shares']
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = df[col].fillna(df[col].median())
+    numeric_cols = [col for col in numeric_cols if col in df.columns]
+    df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].median(numeric_only=True))
     
+    # Steps 3-4 build one mask so the frame is copied only once
     # Step 3: Remove extreme outliers (99th percentile for follower count)
-    follower_threshold = df['follower_count'].quantile(0.99)
-    df = df[df['follower_count'] <= follower_threshold]
-    print(f"After removing outliers: {len(df)} users")
+    followers = df['follower_count'].to_numpy()
+    follower_threshold = np.nanquantile(followers, 0.99)
+    keep = followers <= follower_threshold
+    print(f"After removing outliers: {keep.sum()} users")
     
     # Step 4: Remove inactive accounts (less than 5 posts)
-    df = df[df['posts_count'] >= 5]
-    print(f"After removing inactive accounts: {len(df)} users")
+    keep &= df['posts_count'].to_numpy() >= 5
+    print(f"After removing inactive accounts: {keep.sum()} users")
+    
+    df = df[keep]
     
     # Step 5: Standardize text fields
     df['interests'] = df['interests'].str.lower().str.strip()
     df['city'] = df['city'].str.lower().str.strip()
     df['gender'] = df['gender'].str.strip()
     
+    # Low-cardinality text as categoricals (one copy of each string)
+    df['city'] = df['city'].astype('category')
+    df['gender'] = df['gender'].astype('category')
+    
     # Reset index
     df = df.reset_index(drop=True)
     
@@ -112,15 +124,18 @@ def validate_data(df: pd.DataFrame) -> bool:
 
 
 def save_processed_data(df: pd.DataFrame, output_path: str) -> None:
-    """Save processed data to CSV file."""
+    """Save processed data to a Parquet (.parquet) or CSV file."""
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    df.to_csv(output_path, index=False)
+    if output_path.endswith('.parquet'):
+        df.to_parquet(output_path, compression='zstd', index=False)
+    else:
+        df.to_csv(output_path, index=False)
     print(f"Saved processed data to {output_path}")
 
 
 if __name__ == "__main__":
     # Load raw data
-    raw_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'social_media_users.csv')
+    raw_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'social_media_users.parquet')
     df = load_raw_data(raw_path)
     
     # Clean data
@@ -130,5 +145,5 @@ if __name__ == "__main__":
     validate_data(df_clean)
     
     # Save processed data
-    output_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'cleaned_users.csv')
+    output_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'cleaned_users.parquet')
     save_processed_data(df_clean, output_path)
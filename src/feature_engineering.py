@@ -5,43 +5,59 @@ Extracts and transforms features for the recommendation system.
 
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import StandardScaler
 import os
 import joblib
 
 
 def extract_interest_features(df: pd.DataFrame, max_features: int = 30) -> tuple:
     """
-    Extract TF-IDF features from user interests.
+    Extract multi-hot (binary) features from user interests.
+    
+    Each user lists an interest at most once, so term weighting adds
+    little; a 0/1 indicator per interest carries the same signal.
     
     Args:
         df: DataFrame with 'interests' column
-        max_features: Maximum number of TF-IDF features
+        max_features: Maximum number of interest features
     
     Returns:
-        Tuple of (interest_features DataFrame, fitted TfidfVectorizer)
+        Tuple of (sparse CSR interest matrix, feature names list, fitted CountVectorizer)
     """
-    tfidf = TfidfVectorizer(
+    vectorizer = CountVectorizer(
         max_features=max_features, 
         stop_words='english',
-        token_pattern=r'[a-zA-Z]+'
+        token_pattern=r'[a-zA-Z]+',
+        binary=True
     )
     
-    interest_matrix = tfidf.fit_transform(df['interests'])
+    # Kept sparse: each user has only a handful of interests
+    interest_matrix = vectorizer.fit_transform(df['interests'])
     
-    # Convert to DataFrame
-    feature_names = [f'interest_{word}' for word in tfidf.get_feature_names_out()]
-    interest_df = pd.DataFrame(
-        interest_matrix.toarray(),
-        columns=feature_names,
-        index=df.index
-    )
+    feature_names = [f'interest_{word}' for word in vectorizer.get_feature_names_out()]
     
     print(f"Extracted {len(feature_names)} interest features")
     print(f"Top features: {', '.join(feature_names[:10])}")
     
-    return interest_df, tfidf
+    return interest_matrix, feature_names, vectorizer
+
+
+def encode_categories(values: pd.Series) -> tuple:
+    """
+    Encode a text column as integer category codes.
+    
+    Codes follow the sorted observed values, matching LabelEncoder.
+    
+    Args:
+        values: Column to encode (object or categorical)
+    
+    Returns:
+        Tuple of (codes Series, dict mapping code -> original value)
+    """
+    categories = values.astype('category').cat.remove_unused_categories()
+    categories = categories.cat.reorder_categories(sorted(categories.cat.categories))
+    return categories.cat.codes, dict(enumerate(categories.cat.categories))
 
 
 def create_demographic_features(df: pd.DataFrame) -> tuple:
@@ -52,24 +68,22 @@ def create_demographic_features(df: pd.DataFrame) -> tuple:
         df: DataFrame with demographic columns
     
     Returns:
-        Tuple of (modified DataFrame, gender_encoder, city_encoder)
+        Tuple of (modified DataFrame, gender code mapping, city code mapping)
     """
-    df = df.copy()
+    # Shallow copy: only whole columns are assigned below, so the caller's
+    # frame is left untouched without duplicating its data
+    df = df.copy(deep=False)
     
-    # Age groups (0-4 scale)
-    df['age_group'] = pd.cut(
-        df['age'], 
-        bins=[0, 18, 25, 35, 50, 100],
-        labels=[0, 1, 2, 3, 4]
-    ).astype(int)
+    # Age groups (0-4 scale): (0,18], (18,25], (25,35], (35,50], (50,100]
+    df['age_group'] = np.searchsorted(
+        [18, 25, 35, 50], df['age'].to_numpy(), side='left'
+    ).astype(np.int8)
     
     # Gender encoding
-    le_gender = LabelEncoder()
-    df['gender_encoded'] = le_gender.fit_transform(df['gender'])
+    df['gender_encoded'], le_gender = encode_categories(df['gender'])
     
     # City encoding
-    le_city = LabelEncoder()
-    df['city_encoded'] = le_city.fit_transform(df['city'])
+    df['city_encoded'], le_city = encode_categories(df['city'])
     
     print(f"Created demographic features:")
     print(f"  - Age groups: {df['age_group'].nunique()} unique")
@@ -89,50 +103,58 @@ def create_engagement_features(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         DataFrame with new engagement features
     """
-    df = df.copy()
+    df = df.copy(deep=False)  # whole-column assignments only, as above
+    
+    # Work on the raw columns once instead of re-reading the Series per step
+    likes = df['likes_received'].to_numpy(dtype=np.float64)
+    comments = df['comments_received'].to_numpy(dtype=np.float64)
+    shares = df['shares'].to_numpy(dtype=np.float64)
+    posts = df['posts_count'].to_numpy(dtype=np.float64)
+    followers = df['follower_count'].to_numpy(dtype=np.float64)
+    following = df['following_count'].to_numpy(dtype=np.float64)
     
     # Engagement rate (weighted interactions per post)
-    df['engagement_rate'] = (
-        (df['likes_received'] + 
-         df['comments_received'] * 2 + 
-         df['shares'] * 3) / 
-        df['posts_count'].replace(0, 1)
-    )
+    engagement_rate = likes + comments * 2 + shares * 3
+    engagement_rate /= np.where(posts == 0, 1, posts)
     
     # Normalize engagement (0-1 scale)
-    df['engagement_normalized'] = (
-        (df['engagement_rate'] - df['engagement_rate'].min()) / 
-        (df['engagement_rate'].max() - df['engagement_rate'].min() + 1e-10)
-    )
+    rate_min = np.nanmin(engagement_rate)
+    engagement_normalized = (engagement_rate - rate_min) / (np.nanmax(engagement_rate) - rate_min + 1e-10)
     
     # Follower-to-following ratio
-    df['follower_ratio'] = df['follower_count'] / (df['following_count'] + 1)
+    follower_ratio = followers / (following + 1)
     
     # Normalize follower ratio
-    df['follower_ratio_normalized'] = np.clip(
-        df['follower_ratio'] / df['follower_ratio'].quantile(0.95), 
-        0, 1
-    )
+    follower_ratio_normalized = np.clip(follower_ratio / np.nanquantile(follower_ratio, 0.95), 0, 1)
     
     # Activity score (posts per 100 days of account age)
     if 'account_age_days' in df.columns:
-        df['activity_score'] = df['posts_count'] / (df['account_age_days'] / 100 + 1)
+        activity_score = posts / (df['account_age_days'].to_numpy(dtype=np.float64) / 100 + 1)
     else:
-        df['activity_score'] = df['posts_count'] / 100
+        activity_score = posts / 100
     
     # Normalize activity score
-    df['activity_normalized'] = np.clip(
-        df['activity_score'] / df['activity_score'].quantile(0.95),
-        0, 1
-    )
-    
-    # Influence score (composite metric)
-    df['influence_score'] = (
-        0.35 * df['engagement_normalized'] +
-        0.35 * (df['follower_count'] / (df['follower_count'].max() + 1)) +
-        0.20 * df['follower_ratio_normalized'] +
-        0.10 * df['activity_normalized']
-    )
+    activity_normalized = np.clip(activity_score / np.nanquantile(activity_score, 0.95), 0, 1)
+    
+    # Influence score (composite metric), accumulated in place through one
+    # scratch buffer instead of a temporary per term:
+    # 0.35*engagement + 0.35*followers/(max+1) + 0.20*ratio + 0.10*activity
+    influence_score = np.multiply(engagement_normalized, 0.35)
+    term = np.divide(followers, np.nanmax(followers) + 1)
+    term *= 0.35
+    influence_score += term
+    np.multiply(follower_ratio_normalized, 0.20, out=term)
+    influence_score += term
+    np.multiply(activity_normalized, 0.10, out=term)
+    influence_score += term
+    
+    df['engagement_rate'] = engagement_rate
+    df['engagement_normalized'] = engagement_normalized
+    df['follower_ratio'] = follower_ratio
+    df['follower_ratio_normalized'] = follower_ratio_normalized
+    df['activity_score'] = activity_score
+    df['activity_normalized'] = activity_normalized
+    df['influence_score'] = influence_score
     
     print(f"Created engagement features:")
     print(f"  - Engagement rate: mean={df['engagement_rate'].mean():.2f}")
@@ -142,13 +164,14 @@ def create_engagement_features(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def create_feature_matrix(df: pd.DataFrame, interest_features: pd.DataFrame) -> tuple:
+def create_feature_matrix(df: pd.DataFrame, interest_features, interest_names: list) -> tuple:
     """
     Combine all features into final standardized matrix.
     
     Args:
         df: DataFrame with all features
-        interest_features: DataFrame with TF-IDF interest features
+        interest_features: Sparse multi-hot interest matrix (rows aligned with df)
+        interest_names: Column names of interest_features
     
     Returns:
         Tuple of (scaled feature matrix, scaler, feature names list)
@@ -163,21 +186,24 @@ def create_feature_matrix(df: pd.DataFrame, interest_features: pd.DataFrame) ->
     # Get available columns
     available_cols = [c for c in feature_cols if c in df.columns]
     
-    # Combine with interest features
-    X_numeric = df[available_cols].copy()
-    X_combined = pd.concat([X_numeric.reset_index(drop=True), 
-                           interest_features.reset_index(drop=True)], axis=1)
+    # Combine with interest features into a single dense float32 buffer
+    # (centering below would fill in the sparse zeros anyway); float32 is
+    # plenty for K-Means and cosine similarity at half the memory
+    X_combined = np.hstack([
+        df[available_cols].to_numpy(dtype=np.float32),
+        interest_features.toarray()
+    ], dtype=np.float32)
     
-    # Standardize (CRITICAL for K-Means)
-    scaler = StandardScaler()
+    # Standardize (CRITICAL for K-Means); scale the fresh buffer in place
+    scaler = StandardScaler(copy=False)
     X_scaled = scaler.fit_transform(X_combined)
     
-    feature_names = X_combined.columns.tolist()
+    feature_names = available_cols + list(interest_names)
     
     print(f"\nFinal feature matrix:")
     print(f"  - Shape: {X_scaled.shape}")
     print(f"  - Numeric features: {len(available_cols)}")
-    print(f"  - Interest features: {len(interest_features.columns)}")
+    print(f"  - Interest features: {len(interest_names)}")
     
     return X_scaled, scaler, feature_names
 
@@ -187,7 +213,7 @@ def save_features(X_scaled: np.ndarray, scaler: StandardScaler,
     """Save feature matrix and artifacts."""
     os.makedirs(output_dir, exist_ok=True)
     
-    np.save(os.path.join(output_dir, 'feature_matrix.npy'), X_scaled)
+    np.save(os.path.join(output_dir, 'feature_matrix.npy'), np.ascontiguousarray(X_scaled, dtype=np.float32))
     joblib.dump(scaler, os.path.join(output_dir, 'scaler.pkl'))
     
     with open(os.path.join(output_dir, 'feature_names.txt'), 'w') as f:
@@ -198,26 +224,26 @@ def save_features(X_scaled: np.ndarray, scaler: StandardScaler,
 
 if __name__ == "__main__":
     # Load processed data
-    data_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'cleaned_users.csv')
-    df = pd.read_csv(data_path)
+    data_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'cleaned_users.parquet')
+    df = pd.read_parquet(data_path)
     print(f"Loaded {len(df)} users")
     
     # Extract features
-    interest_features, tfidf_model = extract_interest_features(df)
-    df, gender_encoder, city_encoder = create_demographic_features(df)
+    interest_features, interest_names, interest_vectorizer = extract_interest_features(df)
+    df, gender_codes, city_codes = create_demographic_features(df)
     df = create_engagement_features(df)
-    X_scaled, scaler, feature_names = create_feature_matrix(df, interest_features)
+    X_scaled, scaler, feature_names = create_feature_matrix(df, interest_features, interest_names)
     
     # Save
     output_dir = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed')
     save_features(X_scaled, scaler, feature_names, output_dir)
     
     # Save updated dataframe
-    df.to_csv(os.path.join(output_dir, 'users_with_features.csv'), index=False)
+    df.to_parquet(os.path.join(output_dir, 'users_with_features.parquet'), compression='zstd', index=False)
     
-    # Save encoders
+    # Save the interest vectorizer and category code mappings
     model_dir = os.path.join(os.path.dirname(__file__), '..', 'data', 'models')
     os.makedirs(model_dir, exist_ok=True)
-    joblib.dump(tfidf_model, os.path.join(model_dir, 'tfidf_model.pkl'))
-    joblib.dump(gender_encoder, os.path.join(model_dir, 'gender_encoder.pkl'))
-    joblib.dump(city_encoder, os.path.join(model_dir, 'city_encoder.pkl'))
+    joblib.dump(interest_vectorizer, os.path.join(model_dir, 'interest_vectorizer.pkl'))
+    joblib.dump(gender_codes, os.path.join(model_dir, 'gender_codes.pkl'))
+    joblib.dump(city_codes, os.path.join(model_dir, 'city_codes.pkl'))
@@ -6,7 +6,8 @@ Hybrid recommendation system combining content-based and collaborative filtering
 import pandas as pd
 import numpy as np
 import os
-import joblib
+
+from utils import interest_set
 
 
 def create_similarity_matrix(X: np.ndarray) -> np.ndarray:
@@ -21,8 +22,12 @@ def create_similarity_matrix(X: np.ndarray) -> np.ndarray:
     """
     print("Calculating cosine similarity matrix with numpy...")
     
-    # Normalize the rows
-    norm = np.linalg.norm(X, axis=1, keepdims=True)
+    # Single precision is plenty for cosine scores and keeps the GEMM in SGEMM;
+    # row-major so BLAS doesn't copy-transpose the operands
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    
+    # Normalize the rows (row norms via einsum, without norm()'s temporaries)
+    norm = np.sqrt(np.einsum('ij,ij->i', X, X))[:, None]
     # Avoid division by zero
     norm[norm == 0] = 1
     X_normalized = X / norm
@@ -35,23 +40,123 @@ def create_similarity_matrix(X: np.ndarray) -> np.ndarray:
     return similarity_matrix
 
 
-def calculate_interest_similarity(interests1: str, interests2: str) -> float:
+def save_similarity_matrix(similarity_matrix: np.ndarray, filepath: str) -> None:
     """
-    Calculate Jaccard similarity between two interest strings.
+    Save a similarity matrix as float16.
+    
+    Only one row is read per query, and float16 keeps enough precision
+    for ranking while taking a quarter of the float64 footprint.
     
     Args:
-        interests1: Comma-separated interests for user 1
-        interests2: Comma-separated interests for user 2
+        similarity_matrix: Similarity matrix (n_users x n_users)
+        filepath: Destination .npy path
+    """
+    np.save(filepath, similarity_matrix.astype(np.float16))
+
+
+def load_similarity_matrix(filepath: str) -> np.ndarray:
+    """
+    Memory-map a saved similarity matrix read-only.
+    
+    Rows are paged in from disk on first access instead of loading
+    the whole matrix at startup.
+    
+    Args:
+        filepath: Path to a .npy file written by save_similarity_matrix
     
     Returns:
-        Jaccard similarity score (0-1)
+        Read-only memory-mapped similarity matrix
+    """
+    return np.load(filepath, mmap_mode='r')
+
+
+def quantize_similarity_matrix(similarity_matrix: np.ndarray) -> np.ndarray:
+    """
+    Quantize a similarity matrix to int8 using a per-row max-abs scale.
+    
+    Each row is scaled to the full [-127, 127] range, so the quantized
+    values keep the order of the original scores within the row.
+    
+    Args:
+        similarity_matrix: Similarity matrix (n_users x n_users)
+    
+    Returns:
+        int8 matrix of the same shape
+    """
+    scales = np.max(np.abs(similarity_matrix), axis=1).astype(np.float32)
+    scales[scales == 0] = 1
+    return np.round(similarity_matrix / scales[:, None] * 127).astype(np.int8)
+
+
+def save_quantized_similarity_matrix(similarity_matrix: np.ndarray, filepath: str) -> None:
+    """
+    Save an int8 copy of a similarity matrix for shortlisting candidates.
+    
+    Args:
+        similarity_matrix: Similarity matrix (n_users x n_users)
+        filepath: Destination .npy path
+    """
+    np.save(filepath, quantize_similarity_matrix(similarity_matrix))
+
+
+def shortlist_candidates(quantized_row: np.ndarray, n: int, exclude: int = None) -> np.ndarray:
     """
-    set1 = set(interests1.split(',')) if interests1 else set()
-    set2 = set(interests2.split(',')) if interests2 else set()
+    Find the candidates that can make a row's top n from its int8 scores.
     
-    # Remove empty strings
-    set1 = {s.strip() for s in set1 if s.strip()}
-    set2 = {s.strip() for s in set2 if s.strip()}
+    Quantization never reverses the order of two scores, so every entry
+    of the exact top n has a quantized score at least as high as the
+    (n+1)th largest one. Only those entries need to be re-scored.
+    
+    Args:
+        quantized_row: 1-D int8 row from quantize_similarity_matrix
+        n: Number of results wanted
+        exclude: Optional index to leave out (e.g. the user themselves)
+    
+    Returns:
+        Ascending array of candidate indices
+    """
+    quantized_row = np.asarray(quantized_row)
+    k = min(max(n, 0) + 1, len(quantized_row))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    
+    threshold = np.partition(quantized_row, len(quantized_row) - k)[len(quantized_row) - k]
+    candidates = np.flatnonzero(quantized_row >= threshold)
+    
+    if exclude is not None:
+        candidates = candidates[candidates != exclude]
+    
+    return candidates
+
+
+def interest_sets(interests) -> np.ndarray:
+    """
+    Parse every user's interests once, for callers that compare them repeatedly.
+    
+    Args:
+        interests: Comma-separated interests per user
+    
+    Returns:
+        Object array with one frozenset per user
+    """
+    sets = np.empty(len(interests), dtype=object)
+    sets[:] = [interest_set(value) for value in interests]
+    return sets
+
+
+def calculate_interest_similarity(interests1, interests2) -> float:
+    """
+    Calculate Jaccard similarity between two users' interests.
+    
+    Args:
+        interests1: Comma-separated interests (or parsed set) for user 1
+        interests2: Comma-separated interests (or parsed set) for user 2
+    
+    Returns:
+        Jaccard similarity score (0-1)
+    """
+    set1 = interest_set(interests1)
+    set2 = interest_set(interests2)
     
     intersection = len(set1 & set2)
     union = len(set1 | set2)
@@ -59,52 +164,447 @@ def calculate_interest_similarity(interests1: str, interests2: str) -> float:
     return intersection / union if union > 0 else 0
 
 
-def create_interest_similarity_matrix(df: pd.DataFrame, sample_size: int = None) -> np.ndarray:
+def _interest_tokens(interests: pd.Series) -> tuple:
     """
-    Create interest-based similarity matrix using Jaccard similarity.
+    Tokenize interests the way calculate_interest_similarity does: split on
+    commas, strip whitespace, drop blanks.
     
-    Note: For large datasets, this is computationally expensive.
-    Consider sampling or using approximate methods.
+    Args:
+        interests: Comma-separated interests per user
+    
+    Returns:
+        Tuple of (row position of each token, interest id of each token, vocabulary)
+    """
+    tokens = interests.reset_index(drop=True).str.split(',').explode().str.strip()
+    tokens = tokens[tokens.notna() & (tokens != '')]
+    codes, vocabulary = pd.factorize(tokens)
+    return tokens.index.to_numpy(), codes, vocabulary
+
+
+def interest_membership(interests: pd.Series, dtype=np.float32) -> np.ndarray:
+    """
+    One-hot encode each user's interest set.
+    
+    Args:
+        interests: Comma-separated interests per user
+        dtype: Output dtype
+    
+    Returns:
+        0/1 matrix (n_users x n_distinct_interests)
+    """
+    user_positions, codes, vocabulary = _interest_tokens(interests)
+    
+    membership = np.zeros((len(interests), len(vocabulary)), dtype=dtype)
+    membership[user_positions, codes] = 1
+    return membership
+
+
+def build_interest_index(interests: pd.Series) -> tuple:
+    """
+    Build an inverted index from interests to the users that list them.
+    
+    Only users sharing at least one interest can have a non-zero Jaccard
+    score, so walking the postings of a user's interests touches just
+    those candidates instead of all N users.
+    
+    Args:
+        interests: Comma-separated interests per user
+    
+    Returns:
+        Tuple of (interest ids per user, sorted user positions per interest,
+        number of distinct interests per user)
+    """
+    user_positions, codes, vocabulary = _interest_tokens(interests)
+    
+    # Distinct (user, interest) pairs, ordered by user
+    pairs = np.unique(np.column_stack([user_positions, codes]), axis=0)
+    users, codes = pairs[:, 0], pairs[:, 1]
+    set_sizes = np.bincount(users, minlength=len(interests))
+    user_tokens = np.split(codes, np.cumsum(set_sizes)[:-1])
+    
+    order = np.argsort(codes, kind='stable')
+    postings = np.split(users[order], np.cumsum(np.bincount(codes, minlength=len(vocabulary)))[:-1])
+    
+    return user_tokens, postings, set_sizes
+
+
+def interest_similarity_row(user_idx: int, interest_index: tuple) -> np.ndarray:
+    """
+    Jaccard interest similarity between one user and every user.
+    
+    Args:
+        user_idx: Row position of the target user
+        interest_index: Output of build_interest_index
+    
+    Returns:
+        Similarity row (0 for the user itself and users with no shared interest)
+    """
+    user_tokens, postings, set_sizes = interest_index
+    
+    # Each posting list a user appears in adds one shared interest
+    candidates = [postings[t] for t in user_tokens[user_idx]]
+    intersection = np.bincount(np.concatenate(candidates) if candidates else np.empty(0, dtype=np.intp),
+                               minlength=len(set_sizes)).astype(np.float32)
+    union = set_sizes[user_idx] + set_sizes - intersection
+    
+    sim = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+    sim[user_idx] = 0
+    return sim
+
+
+def compute_interest_top_neighbors(df: pd.DataFrame, k: int = 50,
+                                   block_size: int = 4096) -> tuple:
+    """
+    Find each user's k most interest-similar users (Jaccard) in tiles.
+    
+    Similarities are computed one block_size x block_size tile at a time
+    and merged into a running top-k per row, so the full N x N matrix is
+    never held in memory.
     
     Args:
         df: DataFrame with 'interests' column
-        sample_size: Optional sample size for faster computation
+        k: Number of neighbors to keep per user
+        block_size: Tile edge length
     
     Returns:
-        Interest similarity matrix
+        Tuple of (n_users x k int32 row positions, n_users x k float32 scores), best first
     """
-    if sample_size and len(df) > sample_size:
-        print(f"Sampling {sample_size} users for interest similarity...")
-        indices = np.random.choice(len(df), sample_size, replace=False)
-    else:
-        indices = np.arange(len(df))
+    membership = interest_membership(df['interests'])
+    set_sizes = membership.sum(axis=1)
+    n_users = len(membership)
+    k = max(min(k, n_users - 1), 0)
+    
+    indices = np.empty((n_users, k), dtype=np.int32)
+    scores = np.empty((n_users, k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+    
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        best_idx = np.empty((stop - start, 0), dtype=np.int32)
+        best_sim = np.empty((stop - start, 0), dtype=np.float32)
+        
+        for col_start in range(0, n_users, block_size):
+            col_stop = min(col_start + block_size, n_users)
+            intersection = membership[start:stop] @ membership[col_start:col_stop].T
+            union = set_sizes[start:stop, None] + set_sizes[None, col_start:col_stop] - intersection
+            sim = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+            
+            # Exclude each user from their own neighbors
+            own = np.arange(max(start, col_start), min(stop, col_stop))
+            sim[own - start, own - col_start] = -np.inf
+            
+            # Merge the tile into the running top-k
+            cand_sim = np.hstack([best_sim, sim])
+            cand_idx = np.hstack([
+                best_idx,
+                np.broadcast_to(np.arange(col_start, col_stop, dtype=np.int32), sim.shape)
+            ])
+            if cand_sim.shape[1] > k:
+                keep = np.argpartition(-cand_sim, k - 1, axis=1)[:, :k]
+                cand_sim = np.take_along_axis(cand_sim, keep, axis=1)
+                cand_idx = np.take_along_axis(cand_idx, keep, axis=1)
+            best_sim, best_idx = cand_sim, cand_idx
+        
+        order = np.argsort(-best_sim, axis=1, kind='stable')
+        indices[start:stop] = np.take_along_axis(best_idx, order, axis=1)
+        scores[start:stop] = np.take_along_axis(best_sim, order, axis=1)
+    
+    return indices, scores
+
+
+def top_n_similar(scores: np.ndarray, n: int, exclude: int = None) -> np.ndarray:
+    """
+    Select the indices of the n highest scores, best first.
+    
+    Uses a partial sort so only the top candidates are ordered. Equal
+    scores are ranked by index, so results don't depend on the partition.
     
-    n_users = len(df)
-    interest_sim = np.zeros((n_users, n_users))
+    Args:
+        scores: 1-D array of similarity scores
+        n: Number of indices to return
+        exclude: Optional index to leave out (e.g. the user themselves)
+    
+    Returns:
+        Array of up to n indices sorted by descending score
+    """
+    # Take one extra candidate in case the excluded index is among the top
+    k = min(max(n, 0) + 1, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    
+    # Everything above the kth largest score, then the lowest-index ties
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+    above = np.flatnonzero(scores > kth)
+    tied = np.flatnonzero(scores == kth)[:k - len(above)]
+    top = np.sort(np.concatenate([above, tied]))
+    top = top[np.argsort(-scores[top], kind='stable')]
+    
+    if exclude is not None:
+        top = top[top != exclude]
+    
+    return top[:n]
+
+
+def rank_recommendations(user_idx: int, user_similarity: np.ndarray, *,
+                         interest_index: tuple = None,
+                         n_recommendations: int = 10,
+                         alpha: float = 0.6,
+                         quantized_similarity: np.ndarray = None) -> tuple:
+    """
+    Rank the most similar users for a user using the hybrid score.
     
-    print(f"Calculating interest similarity matrix for {n_users} users...")
+    Args:
+        user_idx: Row position of the target user
+        user_similarity: Feature-based similarity matrix
+        interest_index: Output of build_interest_index (optional); the
+            user's interest similarity row is computed from it on demand
+        n_recommendations: Number of recommendations to return
+        alpha: Weight for feature similarity (1-alpha for interest similarity)
+        quantized_similarity: int8 copy of user_similarity (optional); when
+            given, only its shortlisted candidates are read from user_similarity
     
-    interests_list = df['interests'].tolist()
+    Returns:
+        Tuple of (row positions of recommended users, their combined scores)
+    """
+    if isinstance(interest_index, np.ndarray):
+        raise TypeError("interest_index must come from build_interest_index; "
+                        "dense interest similarity matrices are no longer supported")
+    
+    if quantized_similarity is not None and interest_index is None:
+        # Scan the 1-byte row, then score the shortlist exactly
+        candidates = shortlist_candidates(quantized_similarity[user_idx], n_recommendations,
+                                          exclude=user_idx)
+        candidate_sim = np.asarray(user_similarity[user_idx, candidates], dtype=np.float32)
+        top = top_n_similar(candidate_sim, n_recommendations)
+        return candidates[top], candidate_sim[top]
+    
+    # Calculate combined similarity (rows may be stored as float16,
+    # so score in float32)
+    combined_sim = np.asarray(user_similarity[user_idx], dtype=np.float32)
+    if interest_index is not None:
+        combined_sim = (alpha * combined_sim + 
+                       (1 - alpha) * interest_similarity_row(user_idx, interest_index))
     
-    # Vectorized approach for efficiency
-    for i in range(n_users):
-        if i % 1000 == 0:
-            print(f"  Processing user {i}/{n_users}...")
+    # Get top similar users (exclude self)
+    similar_indices = top_n_similar(combined_sim, n_recommendations, exclude=user_idx)
+    
+    return similar_indices, combined_sim[similar_indices]
+
+
+def batch_rank_recommendations(user_indices: np.ndarray, user_similarity: np.ndarray,
+                               n_recommendations: int = 10) -> tuple:
+    """
+    Rank the most similar users for several users at once.
+
+    All requested rows are gathered in a single take and partially
+    sorted along each row, so a batch costs one pass over the matrix
+    instead of one scattered row read per user. Equal scores are ranked
+    by index, as in top_n_similar.
+
+    Args:
+        user_indices: Row positions of the target users
+        user_similarity: Feature-based similarity matrix
+        n_recommendations: Number of recommendations per user
+
+    Returns:
+        Tuple of (n_users x k row positions, n_users x k scores), best first
+    """
+    user_indices = np.asarray(user_indices, dtype=np.intp)
+    rows = np.asarray(user_similarity[user_indices], dtype=np.float32)
+
+    # Exclude each user from their own results
+    rows[np.arange(len(user_indices)), user_indices] = -np.inf
+
+    k = min(max(n_recommendations, 0), rows.shape[1] - 1)
+    if k <= 0:
+        empty = np.empty((len(user_indices), 0))
+        return empty.astype(np.intp), empty.astype(np.float32)
+
+    # Everything above each row's kth largest score, then the lowest-index
+    # ties; only rows with more ties than slots need trimming
+    kth = -np.partition(-rows, k - 1, axis=1)[:, k - 1:k]
+    above = rows > kth
+    tied = rows == kth
+    selected = above | tied
+    excess = np.flatnonzero(selected.sum(axis=1) > k)
+    if len(excess):
+        slots = k - above[excess].sum(axis=1, keepdims=True)
+        keep = np.cumsum(tied[excess], axis=1, dtype=np.int32) <= slots
+        selected[excess] = above[excess] | (tied[excess] & keep)
+    
+    top = np.nonzero(selected)[1].reshape(len(rows), k)
+    top_scores = np.take_along_axis(rows, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def compute_top_neighbors(user_similarity: np.ndarray, k: int = 50,
+                          block_size: int = 1024) -> tuple:
+    """
+    Precompute the k most similar users for every user.
+    
+    Rows are ranked in blocks with batch_rank_recommendations, so only
+    block_size rows are upcast at a time.
+    
+    Args:
+        user_similarity: Feature-based similarity matrix
+        k: Number of neighbors to keep per user
+        block_size: Rows ranked per batch
+    
+    Returns:
+        Tuple of (n_users x k int32 row positions, n_users x k float32 scores), best first
+    """
+    n_users = len(user_similarity)
+    k = max(min(k, n_users - 1), 0)
+    
+    indices = np.empty((n_users, k), dtype=np.int32)
+    scores = np.empty((n_users, k), dtype=np.float32)
+    for start in range(0, n_users, block_size):
+        rows = np.arange(start, min(start + block_size, n_users))
+        indices[rows], scores[rows] = batch_rank_recommendations(rows, user_similarity, k)
+    
+    return indices, scores
+
+
+def save_top_neighbors(similarity_matrix: np.ndarray, filepath: str, k: int = 50) -> None:
+    """
+    Save each user's top-k neighbors so queries can skip the full row scan.
+    
+    Neighbors are ranked on the float16 values written by
+    save_similarity_matrix, so they agree with ranking the stored matrix.
+    
+    Args:
+        similarity_matrix: Similarity matrix (n_users x n_users)
+        filepath: Destination .npz path
+        k: Number of neighbors to keep per user
+    """
+    indices, scores = compute_top_neighbors(similarity_matrix.astype(np.float16), k)
+    np.savez(filepath, indices=indices, scores=scores)
+
+
+def save_interest_top_neighbors(df: pd.DataFrame, filepath: str, k: int = 50) -> None:
+    """
+    Save each user's top-k interest (Jaccard) neighbors.
+    
+    Args:
+        df: DataFrame with 'interests' column
+        filepath: Destination .npz path
+        k: Number of neighbors to keep per user
+    """
+    indices, scores = compute_interest_top_neighbors(df, k)
+    np.savez(filepath, indices=indices, scores=scores)
+
+
+def save_similarity_artifacts(similarity_matrix: np.ndarray, data_dir: str,
+                              df: pd.DataFrame = None) -> None:
+    """
+    Save the similarity matrix together with the files derived from it.
+    
+    The API ranks from top_neighbors.npz and the int8 shortlist before
+    falling back to the matrix, so all three must be written together or
+    they stop agreeing.
+    
+    Args:
+        similarity_matrix: Similarity matrix (n_users x n_users)
+        data_dir: Directory for similarity_matrix.npy,
+            similarity_matrix_int8.npy and top_neighbors.npz
+        df: User dataframe in matrix row order (optional); when given,
+            interest_neighbors.npz is written as well
+    """
+    save_similarity_matrix(similarity_matrix, os.path.join(data_dir, 'similarity_matrix.npy'))
+    save_quantized_similarity_matrix(similarity_matrix, os.path.join(data_dir, 'similarity_matrix_int8.npy'))
+    save_top_neighbors(similarity_matrix, os.path.join(data_dir, 'top_neighbors.npz'))
+    if df is not None:
+        save_interest_top_neighbors(df, os.path.join(data_dir, 'interest_neighbors.npz'))
+
+
+def build_user_index(df: pd.DataFrame) -> dict:
+    """Map each user ID to its row position, so lookups don't scan the frame."""
+    return {uid: i for i, uid in enumerate(df['user_id'].to_numpy())}
+
+
+def find_user(user_id: str, df: pd.DataFrame, user_index: dict = None) -> int:
+    """
+    Find the row position of a user.
+    
+    Args:
+        user_id: Target user ID
+        df: User dataframe
+        user_index: Output of build_user_index (optional); avoids an O(N) scan
+    
+    Returns:
+        Row position of the user
+    """
+    if user_index is not None:
+        if user_id not in user_index:
+            raise ValueError(f"User {user_id} not found")
+        return user_index[user_id]
+    
+    matches = np.flatnonzero(df['user_id'].to_numpy() == user_id)
+    if not len(matches):
+        raise ValueError(f"User {user_id} not found")
+    return int(matches[0])
+
+
+def user_columns(df: pd.DataFrame) -> dict:
+    """Split a user dataframe into one NumPy array per column."""
+    return {col: df[col].to_numpy() for col in df.columns}
+
+
+def build_recommendation_records(user_idx: int, similar_indices: np.ndarray,
+                                 scores: np.ndarray, columns: dict) -> list:
+    """
+    Build recommendation records from ranked row positions.
+    
+    Args:
+        user_idx: Row position of the target user
+        similar_indices: Row positions of recommended users, best first
+        scores: Combined similarity score for each recommended user
+        columns: Column name -> NumPy array mapping (see user_columns)
+    
+    Returns:
+        List of recommendation dicts
+    """
+    reasons = generate_recommendation_reasons(user_idx, similar_indices, columns)
+    
+    # Read only the fields a record needs, straight from the column arrays
+    user_ids, usernames = columns['user_id'], columns['username']
+    followers, interests = columns['follower_count'], columns['interests']
+    engagement, cities = columns['engagement_rate'], columns['city']
+    segment_names = columns.get('segment_name')
+    segment_ids = columns.get('segment')
+    
+    recommendations = []
+    
+    for idx, score, reason in zip(similar_indices, scores, reasons):
+        if segment_names is not None:
+            segment = segment_names[idx]
+        else:
+            segment = f"Segment {segment_ids[idx] if segment_ids is not None else 'Unknown'}"
         
-        for j in range(i+1, n_users):
-            sim = calculate_interest_similarity(interests_list[i], interests_list[j])
-            interest_sim[i, j] = sim
-            interest_sim[j, i] = sim  # Symmetric
+        recommendations.append({
+            'user_id': user_ids[idx],
+            'username': usernames[idx],
+            'similarity_score': round(float(score), 4),
+            'segment': segment,
+            'follower_count': int(followers[idx]),
+            'interests': interests[idx],
+            'engagement_rate': round(float(engagement[idx]), 2),
+            'city': cities[idx],
+            'reason': reason
+        })
     
-    print("Interest similarity matrix complete!")
-    return interest_sim
+    return recommendations
 
 
 def get_recommendations(user_id: str, df: pd.DataFrame, 
-                       user_similarity: np.ndarray, 
-                       interest_similarity: np.ndarray = None,
+                       user_similarity: np.ndarray, *,
+                       interest_index: tuple = None,
                        n_recommendations: int = 10, 
-                       alpha: float = 0.6) -> pd.DataFrame:
+                       alpha: float = 0.6,
+                       user_index: dict = None) -> pd.DataFrame:
     """
     Generate account recommendations using hybrid approach.
     
@@ -112,107 +612,173 @@ def get_recommendations(user_id: str, df: pd.DataFrame,
         user_id: Target user ID
         df: User dataframe
         user_similarity: Feature-based similarity matrix
-        interest_similarity: Interest-based similarity matrix (optional)
+        interest_index: Output of build_interest_index (optional)
         n_recommendations: Number of recommendations to return
         alpha: Weight for feature similarity (1-alpha for interest similarity)
+        user_index: Output of build_user_index (optional)
     
     Returns:
         DataFrame with recommended accounts
     """
-    # Get user index
-    user_mask = df['user_id'] == user_id
-    if not user_mask.any():
-        raise ValueError(f"User {user_id} not found")
+    user_idx = find_user(user_id, df, user_index)
     
-    user_idx = df[user_mask].index[0]
-    user_data = df.iloc[user_idx]
+    similar_indices, scores = rank_recommendations(
+        user_idx, user_similarity, interest_index=interest_index,
+        n_recommendations=n_recommendations, alpha=alpha
+    )
     
-    # Calculate combined similarity
-    if interest_similarity is not None:
-        combined_sim = (alpha * user_similarity[user_idx] + 
-                       (1 - alpha) * interest_similarity[user_idx])
-    else:
-        combined_sim = user_similarity[user_idx]
+    # Only the target and recommended rows are needed to build the records
+    columns = user_columns(df.iloc[np.concatenate(([user_idx], similar_indices))])
+    recommendations = build_recommendation_records(
+        0, np.arange(1, len(similar_indices) + 1), scores, columns
+    )
     
-    # Get top similar users (exclude self)
-    similar_indices = np.argsort(combined_sim)[::-1]
-    similar_indices = [idx for idx in similar_indices if idx != user_idx][:n_recommendations]
+    return pd.DataFrame(recommendations)
+
+
+def get_all_recommendations(df: pd.DataFrame, user_similarity: np.ndarray,
+                            n_recommendations: int = 10,
+                            block_size: int = 1024) -> pd.DataFrame:
+    """
+    Generate recommendations for every user in one batched pass.
     
-    # Create recommendations dataframe
-    recommendations = []
+    Neighbors are ranked in row blocks with compute_top_neighbors, and the
+    record fields and reasons are filled column-wise over all (user,
+    recommendation) pairs instead of calling get_recommendations per user.
     
-    for idx in similar_indices:
-        rec_user = df.iloc[idx]
-        
-        recommendations.append({
-            'user_id': rec_user['user_id'],
-            'username': rec_user['username'],
-            'similarity_score': round(combined_sim[idx], 4),
-            'segment': rec_user.get('segment_name', f"Segment {rec_user.get('segment', 'Unknown')}"),
-            'follower_count': int(rec_user['follower_count']),
-            'interests': rec_user['interests'],
-            'engagement_rate': round(rec_user['engagement_rate'], 2),
-            'city': rec_user['city'],
-            'reason': generate_recommendation_reason(user_data, rec_user)
-        })
+    Args:
+        df: User dataframe
+        user_similarity: Feature-based similarity matrix
+        n_recommendations: Number of recommendations per user
+        block_size: Rows ranked per batch
     
-    return pd.DataFrame(recommendations)
+    Returns:
+        DataFrame with one row per (user, recommendation), best first per user
+    """
+    top_indices, top_scores = compute_top_neighbors(user_similarity, k=n_recommendations,
+                                                    block_size=block_size)
+    n_users, k = top_indices.shape
+    sources = np.repeat(np.arange(n_users), k)
+    targets = top_indices.ravel().astype(np.intp)
+    columns = user_columns(df)
+    
+    if 'segment_name' in columns:
+        segments = columns['segment_name'][targets]
+    else:
+        segment_ids = columns['segment'][targets] if 'segment' in columns else ['Unknown'] * len(targets)
+        segments = [f"Segment {segment}" for segment in segment_ids]
+    
+    # Round with Python's round, as build_recommendation_records does;
+    # np.round can differ on values near a half
+    return pd.DataFrame({
+        'source_user_id': columns['user_id'][sources],
+        'rank': np.tile(np.arange(1, k + 1), n_users),
+        'user_id': columns['user_id'][targets],
+        'username': columns['username'][targets],
+        'similarity_score': [round(score, 4) for score in top_scores.ravel().tolist()],
+        'segment': segments,
+        'follower_count': columns['follower_count'][targets].astype(int),
+        'interests': columns['interests'][targets],
+        'engagement_rate': [round(float(rate), 2) for rate in columns['engagement_rate'][targets]],
+        'city': columns['city'][targets],
+        'reason': generate_recommendation_reasons(sources, targets, columns)
+    })
 
 
-def generate_recommendation_reason(user: pd.Series, recommended_user: pd.Series) -> str:
+def generate_recommendation_reason(user, recommended_user) -> str:
     """
     Generate human-readable explanation for recommendation.
     
     Args:
-        user: Source user data
-        recommended_user: Recommended user data
+        user: Source user data (Series or dict)
+        recommended_user: Recommended user data (Series or dict)
     
     Returns:
         Explanation string
     """
-    reasons = []
+    columns = {col: np.array([user[col], recommended_user[col]], dtype=object)
+               for col in user.keys() if col in recommended_user}
+    return generate_recommendation_reasons(0, np.array([1]), columns)[0]
+
+
+def generate_recommendation_reasons(user_idx, similar_indices: np.ndarray,
+                                    columns: dict) -> list:
+    """
+    Generate explanations for several recommended users at once.
+    
+    Each rule is evaluated as one array comparison over the (target,
+    recommended) pairs, and each distinct user's interests are parsed once.
+    
+    Args:
+        user_idx: Row position of the target user, or one per recommended user
+        similar_indices: Row positions of recommended users
+        columns: Column name -> NumPy array mapping (see user_columns); an
+            'interest_set' entry from interest_sets skips re-parsing interests
+    
+    Returns:
+        List of explanation strings, one per recommended user
+    """
+    similar_indices = np.asarray(similar_indices, dtype=np.intp)
+    user_rows = np.broadcast_to(np.asarray(user_idx, dtype=np.intp), similar_indices.shape)
+    reasons = [[] for _ in range(len(similar_indices))]
+    
+    # Check interest overlap, parsing only the rows involved if the sets
+    # were not precomputed
+    if 'interest_set' in columns:
+        user_interest_sets = columns['interest_set'][user_rows]
+        rec_interest_sets = columns['interest_set'][similar_indices]
+    else:
+        rows, inverse = np.unique(np.concatenate([user_rows, similar_indices]), return_inverse=True)
+        parsed = interest_sets(columns['interests'][rows])[inverse]
+        user_interest_sets = parsed[:len(similar_indices)]
+        rec_interest_sets = parsed[len(similar_indices):]
     
-    # Check interest overlap
-    user_interests = set(user['interests'].split(',')) if user['interests'] else set()
-    rec_interests = set(recommended_user['interests'].split(',')) if recommended_user['interests'] else set()
-    common_interests = user_interests & rec_interests
-    common_interests = {i.strip() for i in common_interests if i.strip()}
+    for rec_reasons, user_interests, rec_interests in zip(reasons, user_interest_sets, rec_interest_sets):
+        common_interests = user_interests & rec_interests
+        
+        if len(common_interests) >= 3:
+            top_common = list(common_interests)[:3]
+            rec_reasons.append(f"Shares interests: {', '.join(top_common)}")
+        elif len(common_interests) >= 1:
+            rec_reasons.append(f"Common interest: {list(common_interests)[0]}")
     
-    if len(common_interests) >= 3:
-        top_common = list(common_interests)[:3]
-        reasons.append(f"Shares interests: {', '.join(top_common)}")
-    elif len(common_interests) >= 1:
-        reasons.append(f"Common interest: {list(common_interests)[0]}")
+    # Each check is (matches, reason template, per-pair values for the template)
+    checks = []
     
     # Check segment
-    user_segment = user.get('segment_name', user.get('segment', ''))
-    rec_segment = recommended_user.get('segment_name', recommended_user.get('segment', ''))
-    if user_segment and user_segment == rec_segment:
-        reasons.append(f"Same segment: {user_segment}")
+    segment_col = next((col for col in ('segment_name', 'segment') if col in columns), None)
+    if segment_col is not None:
+        user_segments = columns[segment_col][user_rows]
+        same_segment = (columns[segment_col][similar_indices] == user_segments) & user_segments.astype(bool)
+        checks.append((same_segment, "Same segment: {}", user_segments))
     
     # Check location
-    if user['city'] == recommended_user['city']:
-        reasons.append(f"Same city: {user['city']}")
+    user_cities = columns['city'][user_rows]
+    checks.append((columns['city'][similar_indices] == user_cities, "Same city: {}", user_cities))
     
     # Check age similarity
-    if 'age' in user.index and 'age' in recommended_user.index:
-        age_diff = abs(user['age'] - recommended_user['age'])
-        if age_diff <= 5:
-            reasons.append("Similar age group")
+    if 'age' in columns:
+        age_diff = np.abs(columns['age'][similar_indices] - columns['age'][user_rows])
+        checks.append((age_diff <= 5, "Similar age group", None))
     
     # Check engagement level
-    if 'engagement_rate' in user.index and 'engagement_rate' in recommended_user.index:
-        if abs(user['engagement_rate'] - recommended_user['engagement_rate']) < user['engagement_rate'] * 0.3:
-            reasons.append("Similar engagement level")
-    
-    if reasons:
-        return " | ".join(reasons[:2])  # Return top 2 reasons
-    else:
-        return "Similar overall profile"
+    if 'engagement_rate' in columns:
+        user_rates = columns['engagement_rate'][user_rows]
+        rate_diff = np.abs(columns['engagement_rate'][similar_indices] - user_rates)
+        checks.append((rate_diff < user_rates * 0.3, "Similar engagement level", None))
+    
+    for matches, reason, values in checks:
+        for i in np.flatnonzero(np.asarray(matches, dtype=bool)):
+            reasons[i].append(reason if values is None else reason.format(values[i]))
+    
+    # Return top 2 reasons
+    return [" | ".join(rec_reasons[:2]) if rec_reasons else "Similar overall profile"
+            for rec_reasons in reasons]
 
 
 def get_segment_based_recommendations(user_id: str, df: pd.DataFrame, 
-                                      n_recommendations: int = 5) -> pd.DataFrame:
+                                      n_recommendations: int = 5,
+                                      user_index: dict = None) -> pd.DataFrame:
     """
     Recommend top users from the same segment.
     
@@ -220,18 +786,18 @@ def get_segment_based_recommendations(user_id: str, df: pd.DataFrame,
         user_id: Target user ID
         df: User dataframe
         n_recommendations: Number of recommendations
+        user_index: Output of build_user_index (optional)
     
     Returns:
         DataFrame with segment-based recommendations
     """
-    user_mask = df['user_id'] == user_id
-    if not user_mask.any():
-        raise ValueError(f"User {user_id} not found")
-    
-    user_segment = df.loc[user_mask, 'segment'].values[0]
+    user_idx = find_user(user_id, df, user_index)
+    segments = df['segment'].to_numpy()
     
     # Get users from same segment, excluding target user
-    segment_users = df[(df['segment'] == user_segment) & (df['user_id'] != user_id)]
+    segment_mask = segments == segments[user_idx]
+    segment_mask[user_idx] = False
+    segment_users = df[segment_mask]
     
     # Sort by influence score
     top_users = segment_users.nlargest(n_recommendations, 'influence_score')
@@ -242,7 +808,8 @@ def get_segment_based_recommendations(user_id: str, df: pd.DataFrame,
 
 def get_diverse_recommendations(user_id: str, df: pd.DataFrame,
                                user_similarity: np.ndarray,
-                               n_recommendations: int = 10) -> pd.DataFrame:
+                               n_recommendations: int = 10,
+                               user_index: dict = None) -> pd.DataFrame:
     """
     Get diverse recommendations from different segments.
     
@@ -251,43 +818,51 @@ def get_diverse_recommendations(user_id: str, df: pd.DataFrame,
         df: User dataframe
         user_similarity: Feature-based similarity matrix
         n_recommendations: Number of recommendations
+        user_index: Output of build_user_index (optional)
     
     Returns:
         DataFrame with diverse recommendations
     """
-    user_mask = df['user_id'] == user_id
-    user_idx = df[user_mask].index[0]
-    user_segment = df.loc[user_mask, 'segment'].values[0]
+    user_idx = find_user(user_id, df, user_index)
     
-    recommendations = []
+    chosen_indices = []
+    chosen_sims = []
+    chosen_segments = []
+    segment_labels = df['segment'].to_numpy()
     segments = df['segment'].unique()
     recs_per_segment = max(1, n_recommendations // len(segments))
     
     for segment in segments:
-        segment_mask = (df['segment'] == segment) & (df['user_id'] != user_id)
-        segment_indices = df[segment_mask].index.tolist()
+        segment_mask = segment_labels == segment
+        segment_mask[user_idx] = False
+        segment_indices = np.flatnonzero(segment_mask)
         
-        if not segment_indices:
+        if not len(segment_indices):
             continue
         
         # Get similarities for this segment
-        segment_sims = [(idx, user_similarity[user_idx, idx]) for idx in segment_indices]
-        segment_sims.sort(key=lambda x: x[1], reverse=True)
+        segment_sims = user_similarity[user_idx, segment_indices]
+        top = top_n_similar(segment_sims, recs_per_segment)
         
         # Take top from this segment
-        for idx, sim in segment_sims[:recs_per_segment]:
-            rec_user = df.iloc[idx]
-            recommendations.append({
-                'user_id': rec_user['user_id'],
-                'username': rec_user['username'],
-                'similarity_score': round(sim, 4),
-                'segment': rec_user.get('segment_name', f"Segment {segment}"),
-                'follower_count': int(rec_user['follower_count']),
-                'interests': rec_user['interests']
-            })
+        chosen_indices.append(segment_indices[top])
+        chosen_sims.append(segment_sims[top])
+        chosen_segments.extend([f"Segment {segment}"] * len(top))
+    
+    # Build the result column-wise from the raw arrays
+    rows = np.concatenate(chosen_indices)
+    if 'segment_name' in df.columns:
+        chosen_segments = df['segment_name'].to_numpy()[rows]
+    rec_df = pd.DataFrame({
+        'user_id': df['user_id'].to_numpy()[rows],
+        'username': df['username'].to_numpy()[rows],
+        'similarity_score': [round(float(sim), 4) for sim in np.concatenate(chosen_sims)],
+        'segment': chosen_segments,
+        'follower_count': df['follower_count'].to_numpy()[rows].astype(int),
+        'interests': df['interests'].to_numpy()[rows]
+    })
     
     # Sort by similarity and limit
-    rec_df = pd.DataFrame(recommendations)
     rec_df = rec_df.sort_values('similarity_score', ascending=False).head(n_recommendations)
     
     return rec_df
@@ -304,8 +879,8 @@ if __name__ == "__main__":
     # Create similarity matrix
     user_similarity = create_similarity_matrix(X)
     
-    # Save similarity matrix
-    np.save(os.path.join(data_dir, 'similarity_matrix.npy'), user_similarity)
+    # Save similarity matrix and the files derived from it
+    save_similarity_artifacts(user_similarity, data_dir, df)
     
     # Test recommendations for a sample user
     sample_user_id = df['user_id'].iloc[0]
@@ -5,7 +5,7 @@ K-Means clustering for user segmentation with optimal cluster selection.
 
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.metrics import silhouette_score
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend for servers
@@ -13,32 +13,66 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 import joblib
+from joblib import Parallel, delayed, parallel_config
 
+# Above this many rows the sweep switches to MiniBatchKMeans and a sampled
+# silhouette score; smaller datasets keep the exact scores
+MINIBATCH_THRESHOLD = 10000
 
-def find_optimal_clusters(X: np.ndarray, max_k: int = 10, output_dir: str = None) -> int:
+
+def score_clusters(X: np.ndarray, k: int) -> tuple:
+    """
+    Fit one candidate k for the cluster sweep.
+    
+    Args:
+        X: Feature matrix
+        k: Number of clusters
+    
+    Returns:
+        Tuple of (inertia, silhouette score)
+    """
+    if len(X) <= MINIBATCH_THRESHOLD:
+        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10, max_iter=300)
+        labels = kmeans.fit_predict(X)
+        return kmeans.inertia_, silhouette_score(X, labels)
+    
+    kmeans = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=3,
+                             batch_size=4096, max_iter=100)
+    labels = kmeans.fit_predict(X)
+    sil_score = silhouette_score(X, labels, sample_size=MINIBATCH_THRESHOLD, random_state=42)
+    return kmeans.inertia_, sil_score
+
+
+def find_optimal_clusters(X: np.ndarray, max_k: int = 10, output_dir: str = None,
+                          n_jobs: int = 1) -> int:
     """
     Find optimal number of clusters using Elbow Method and Silhouette Score.
     
+    Above MINIBATCH_THRESHOLD rows the sweep uses MiniBatchKMeans and a
+    sampled silhouette score; the winning k is then fitted with full
+    KMeans in perform_clustering.
+    
     Args:
         X: Feature matrix
         max_k: Maximum number of clusters to try
         output_dir: Directory to save visualization
+        n_jobs: Number of candidate k values fitted in parallel (1 runs the
+            sweep serially, -1 uses all cores)
     
     Returns:
         Optimal number of clusters
     """
-    inertias = []
-    silhouette_scores = []
     K_range = range(2, max_k + 1)
     
     print("Finding optimal clusters...")
-    for k in K_range:
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10, max_iter=300)
-        labels = kmeans.fit_predict(X)
-        
-        inertias.append(kmeans.inertia_)
-        sil_score = silhouette_score(X, labels)
-        silhouette_scores.append(sil_score)
+    # Each k is independent, so fit them in parallel worker processes; each
+    # worker gets one BLAS/OpenMP thread so the workers don't oversubscribe
+    with parallel_config(backend='loky', inner_max_num_threads=1):
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(score_clusters)(X, k) for k in K_range
+        )
+    inertias, silhouette_scores = map(list, zip(*results))
+    for k, sil_score in zip(K_range, silhouette_scores):
         print(f"  k={k}: Silhouette Score = {sil_score:.4f}")
     
     # Create visualization
@@ -119,33 +153,29 @@ def profile_segments(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         DataFrame with segment profiles
     """
-    segment_profiles = []
-    
-    for seg in sorted(df['segment'].unique()):
-        seg_data = df[df['segment'] == seg]
-        
-        # Get top interests
-        all_interests = ','.join(seg_data['interests']).split(',')
-        interest_counts = pd.Series(all_interests).value_counts()
-        top_interests = interest_counts.head(5).index.tolist()
-        
-        # Get top cities
-        top_cities = seg_data['city'].value_counts().head(3).index.tolist()
-        
-        profile = {
-            'Segment': seg,
-            'Size': len(seg_data),
-            'Percentage': f"{len(seg_data)/len(df)*100:.1f}%",
-            'Avg_Age': round(seg_data['age'].mean(), 1),
-            'Avg_Followers': int(seg_data['follower_count'].mean()),
-            'Avg_Engagement_Rate': round(seg_data['engagement_rate'].mean(), 2),
-            'Avg_Influence_Score': round(seg_data['influence_score'].mean(), 3),
-            'Top_Interests': ', '.join(top_interests[:3]),
-            'Top_Cities': ', '.join(top_cities)
-        }
-        segment_profiles.append(profile)
-    
-    profile_df = pd.DataFrame(segment_profiles)
+    # Per-segment aggregates in one grouped pass
+    grouped = df.groupby('segment', sort=True)
+    sizes = grouped.size()
+    means = grouped[['age', 'follower_count', 'engagement_rate', 'influence_score']].mean()
+    
+    # Top interests and cities, counted within each segment's group
+    interests = df[['segment']].assign(interest=df['interests'].str.split(',')).explode('interest')
+    top_interests = interests.groupby('segment')['interest'].agg(
+        lambda values: ', '.join(values.value_counts().head(3).index)
+    )
+    top_cities = grouped['city'].agg(lambda values: ', '.join(values.value_counts().head(3).index))
+    
+    profile_df = pd.DataFrame({
+        'Segment': sizes.index.to_numpy(),
+        'Size': sizes.to_numpy(),
+        'Percentage': [f"{size/len(df)*100:.1f}%" for size in sizes],
+        'Avg_Age': means['age'].round(1).to_numpy(),
+        'Avg_Followers': means['follower_count'].astype(int).to_numpy(),
+        'Avg_Engagement_Rate': means['engagement_rate'].round(2).to_numpy(),
+        'Avg_Influence_Score': means['influence_score'].round(3).to_numpy(),
+        'Top_Interests': top_interests.to_numpy(),
+        'Top_Cities': top_cities.to_numpy()
+    })
     
     print("\n" + "="*80)
     print("SEGMENT PROFILES")
@@ -165,20 +195,18 @@ def assign_segment_names(df: pd.DataFrame) -> tuple:
     Returns:
         Tuple of (updated DataFrame, segment names dictionary)
     """
-    df = df.copy()
-    segment_stats = []
-    
-    for seg in df['segment'].unique():
-        seg_data = df[df['segment'] == seg]
-        segment_stats.append({
-            'segment': seg,
-            'avg_followers': seg_data['follower_count'].mean(),
-            'avg_engagement': seg_data['engagement_rate'].mean(),
-            'avg_influence': seg_data['influence_score'].mean(),
-            'avg_activity': seg_data['activity_normalized'].mean() if 'activity_normalized' in df.columns else 0
-        })
-    
-    stats_df = pd.DataFrame(segment_stats)
+    # Only segment_name is added, so a shallow copy keeps the input intact
+    df = df.copy(deep=False)
+    
+    # Per-segment averages in one grouped pass (segments in order of appearance)
+    averages = {
+        'avg_followers': ('follower_count', 'mean'),
+        'avg_engagement': ('engagement_rate', 'mean'),
+        'avg_influence': ('influence_score', 'mean')
+    }
+    if 'activity_normalized' in df.columns:
+        averages['avg_activity'] = ('activity_normalized', 'mean')
+    stats_df = df.groupby('segment', sort=False).agg(**averages).reset_index()
     
     # Sort by influence score to assign names
     stats_df = stats_df.sort_values('avg_influence', ascending=False).reset_index(drop=True)
@@ -204,9 +232,9 @@ def assign_segment_names(df: pd.DataFrame) -> tuple:
     df['segment_name'] = df['segment'].map(segment_names)
     
     print("\nSegment Names:")
+    segment_sizes = df['segment'].value_counts()
     for seg, name in sorted(segment_names.items()):
-        seg_data = df[df['segment'] == seg]
-        print(f"  Segment {seg}: {name} ({len(seg_data):,} users)")
+        print(f"  Segment {seg}: {name} ({segment_sizes[seg]:,} users)")
     
     return df, segment_names
 
@@ -260,7 +288,7 @@ def visualize_segments(df: pd.DataFrame, output_dir: str = None) -> None:
 if __name__ == "__main__":
     # Load data and features
     data_dir = os.path.join(os.path.dirname(__file__), '..', 'data', 'processed')
-    df = pd.read_csv(os.path.join(data_dir, 'users_with_features.csv'))
+    df = pd.read_parquet(os.path.join(data_dir, 'users_with_features.parquet'))
     X = np.load(os.path.join(data_dir, 'feature_matrix.npy'))
     
     print(f"Loaded {len(df)} users with {X.shape[1]} features")
@@ -291,6 +319,7 @@ if __name__ == "__main__":
     
     # Save updated dataframe
     df.to_csv(os.path.join(data_dir, 'users_segmented.csv'), index=False)
+    df.to_parquet(os.path.join(data_dir, 'users_segmented.parquet'), compression='zstd', index=False)
     profile_df.to_csv(os.path.join(os.path.dirname(__file__), '..', 'results', 'segment_profiles.csv'), index=False)
     
     print("\nSegmentation complete!")
@@ -40,10 +40,28 @@ def format_number(num: float) -> str:
 
 
 def calculate_percentile(value: float, series: pd.Series) -> float:
-    """Calculate percentile rank of a value in a series."""
+    """Calculate percentile rank of a value in a series (see percentile_ranker for repeated use)."""
     return (series < value).sum() / len(series) * 100
 
 
+def percentile_ranker(series: pd.Series):
+    """
+    Sort a series once and return a function giving percentile ranks against it.
+    
+    Each lookup is a binary search, and arrays of values are ranked in one
+    vectorized call.
+    """
+    sorted_values = np.sort(np.asarray(series, dtype=float))
+    
+    def rank(values):
+        values = np.asarray(values, dtype=float)
+        ranks = np.searchsorted(sorted_values, values, side='left') / len(sorted_values) * 100
+        # Nothing compares below NaN, as in calculate_percentile
+        return np.where(np.isnan(values), 0.0, ranks)[()]
+    
+    return rank
+
+
 def get_project_root() -> str:
     """Get the project root directory."""
     return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -77,17 +95,22 @@ def normalize_column(series: pd.Series) -> pd.Series:
 
 
 def split_interests(interests_str: str) -> list:
-    """Split comma-separated interests into list."""
-    if not interests_str or pd.isna(interests_str):
+    """Split comma-separated interests into list (missing or non-string values give [])."""
+    if not isinstance(interests_str, str) or not interests_str:
         return []
     return [i.strip() for i in interests_str.split(',') if i.strip()]
 
 
-def count_common_interests(interests1: str, interests2: str) -> int:
-    """Count number of common interests between two users."""
-    set1 = set(split_interests(interests1))
-    set2 = set(split_interests(interests2))
-    return len(set1 & set2)
+def interest_set(interests) -> frozenset:
+    """Parse comma-separated interests into a set (already parsed sets pass through)."""
+    if isinstance(interests, (set, frozenset)):
+        return interests
+    return frozenset(split_interests(interests))
+
+
+def count_common_interests(interests1, interests2) -> int:
+    """Count number of common interests between two users (strings or parsed sets)."""
+    return len(interest_set(interests1) & interest_set(interests2))
 
 
 class MetricsTracker: